@@ -0,0 +1,50 @@
+# Testing_tools/airport_db_benchmark.py
+# Reports airport database load time, index build time and resolve_airport
+# lookup latency (p50/p95/p99) over a mix of codes, cities, names and typos.
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+QUERIES = [
+    "JFK", "LHR", "NYC", "LON", "TYO", "Narita", "Heathrow", "Charles de Gaulle",
+    "Frankfurt", "Sao Paulo", "new york", "san fran", "Tokyo", "Zurich", "o hare",
+    "heathrw", "frankfrut", "bostn", "Sydney", "Dubai",
+]
+ROUNDS = 200
+
+start = time.perf_counter()
+import airport_db
+db = airport_db.AirportDB()
+count = len(db)
+load_ms = (time.perf_counter() - start) * 1000
+
+start = time.perf_counter()
+db.get("JFK")
+get_ms = (time.perf_counter() - start) * 1000
+
+start = time.perf_counter()
+db.search("warmup")
+index_ms = (time.perf_counter() - start) * 1000
+
+timings = []
+for _ in range(ROUNDS):
+    for query in QUERIES:
+        start = time.perf_counter()
+        db.search(query, 10)
+        timings.append((time.perf_counter() - start) * 1000)
+timings.sort()
+
+
+def pct(p: float) -> float:
+    return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+
+print(f"airports:            {count}")
+print(f"file size:           {os.path.getsize(db.path) / 1024:.0f} KB")
+print(f"import + mmap:       {load_ms:.2f} ms")
+print(f"first exact lookup:  {get_ms:.3f} ms")
+print(f"search index build:  {index_ms:.1f} ms (once, on first search)")
+print(f"search latency:      p50 {pct(0.50):.3f} ms  p95 {pct(0.95):.3f} ms  p99 {pct(0.99):.3f} ms  mean {statistics.mean(timings):.3f} ms")
@@ -0,0 +1,77 @@
+# Testing_tools/connection_reuse_check.py
+# Starts a local keep-alive stub for SerpAPI and Duffel, points the server at it
+# and checks that repeated tool calls share one upstream connection per provider.
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src', 'api_response_sample.json'))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = set()
+    requests = {}
+
+    def _reply(self, body: bytes):
+        provider = self.path.split("/")[1]
+        StubHandler.connections.add((provider, self.client_address))
+        StubHandler.requests[provider] = StubHandler.requests.get(provider, 0) + 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/serpapi/"):
+            with open(SAMPLE, "rb") as f:
+                self._reply(f.read())
+        else:
+            self._reply(json.dumps({"data": {"id": "off_stub"}}).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+stub = f"http://127.0.0.1:{server.server_port}"
+
+os.environ["SERPAPI_BASE"] = f"{stub}/serpapi/"
+os.environ["DUFFEL_BASE"] = f"{stub}/duffel/"
+os.environ.setdefault("SERPAPI_API_KEY", "stub")
+os.environ.setdefault("DUFFEL_TOKEN", "stub")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import http_pool
+from mcp_server_base import search_flights, booking_validate_or_price_offer
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def main():
+    calls = 10
+    for day in range(1, calls + 1):
+        # distinct dates so the response cache doesn't short-circuit the calls
+        await search_flights("JFK", "LAX", f"2025-09-{day:02d}", "2025-09-28")
+        # refresh so the validated-offer cache doesn't answer after the first call
+        await booking_validate_or_price_offer("off_stub", refresh=True)
+    await http_pool.aclose_all()
+
+    per_provider = {}
+    for provider, addr in StubHandler.connections:
+        per_provider.setdefault(provider, set()).add(addr)
+    for provider, addrs in sorted(per_provider.items()):
+        print(f"{provider}: {StubHandler.requests[provider]} calls over {len(addrs)} connection(s)")
+    assert all(n == calls for n in StubHandler.requests.values()), f"not every call reached upstream: {StubHandler.requests}"
+    assert all(len(addrs) == 1 for addrs in per_provider.values()), "connections were not reused"
+    print("OK: upstream connections are reused")
+
+
+asyncio.run(main())
+server.shutdown()
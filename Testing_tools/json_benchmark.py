@@ -0,0 +1,103 @@
+# Testing_tools/json_benchmark.py
+# CPU time and allocations per call of the JSON work around one search_flights
+# response (the recorded SerpAPI sample), comparing the old pipeline
+# (response.json() -> dict -> FastMCP's pydantic encoder, json.dumps to size
+# cache entries) with src/fastjson.py (lazy Document, raw pass-through,
+# orjson when installed). Prints JSON:
+#
+#   python Testing_tools/json_benchmark.py [runs]
+import json
+import os
+import sys
+import time
+import tracemalloc
+import zlib
+
+import httpx
+import pydantic_core
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import fastjson
+import projections
+
+SAMPLE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src', 'api_response_sample.json'))
+
+with open(SAMPLE, 'rb') as f:
+    RAW = f.read()
+
+
+def response() -> httpx.Response:
+    return httpx.Response(200, content=RAW, headers={"content-type": "application/json"})
+
+
+def fastmcp_encode(value) -> str:
+    """What FastMCP does with a dict tool result."""
+    return pydantic_core.to_json(value, fallback=str, indent=2).decode()
+
+
+# name -> (old pipeline, new pipeline); each builds the tool output from a fresh response
+CASES = {
+    "search_flights view=full": (
+        lambda: fastmcp_encode(response().json()),
+        lambda: fastjson.tool_text(fastjson.Document(response().content)),
+    ),
+    "search_flights view=compact": (
+        lambda: fastmcp_encode(projections.compact_search(response().json())),
+        lambda: fastjson.tool_text(projections.compact_search(fastjson.Document(response().content))),
+    ),
+    "cache insert (entry size)": (
+        lambda: len(json.dumps(response().json(), separators=(",", ":"), default=str)),
+        lambda: fastjson.size(fastjson.Document(response().content)),
+    ),
+    "sqlite cache round trip, full view": (
+        lambda: fastmcp_encode(json.loads(zlib.decompress(zlib.compress(
+            json.dumps(response().json(), separators=(",", ":")).encode(), 6)))),
+        lambda: fastjson.tool_text(fastjson.Document(zlib.decompress(zlib.compress(
+            fastjson.encode(fastjson.Document(response().content)), 6)))),
+    ),
+}
+
+
+def cpu_us(fn, runs: int) -> float:
+    fn()  # warm up
+    started = time.process_time()
+    for _ in range(runs):
+        fn()
+    return (time.process_time() - started) / runs * 1e6
+
+
+def allocations(fn) -> dict:
+    """Peak traced memory and number of allocated blocks during one call."""
+    fn()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    return {"peak_kb": round(peak / 1024, 1), "live_blocks": blocks}
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    report = {"backend": fastjson.BACKEND, "response_bytes": len(RAW), "runs": runs, "cases": {}}
+    for name, (old, new) in CASES.items():
+        before, after = old(), new()
+        if isinstance(before, str):
+            assert json.loads(before) == json.loads(after), f"{name}: outputs differ"
+        old_us, new_us = cpu_us(old, runs), cpu_us(new, runs)
+        report["cases"][name] = {
+            "old_cpu_us": round(old_us, 1),
+            "new_cpu_us": round(new_us, 1),
+            "speedup": round(old_us / new_us, 1) if new_us else None,
+            "old_alloc": allocations(old),
+            "new_alloc": allocations(new),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+# Testing_tools/load_benchmark.py
+# Offline load test: starts the local SerpAPI/Duffel stub (stub_upstream.py),
+# runs the MCP server against it and drives every tool through the real
+# FastMCP streamable HTTP transport at a fixed concurrency. Each tool gets a
+# fresh server process so its peak memory is its own.
+#
+# Reports per tool: throughput, p50/p95/p99 latency, response bytes and the
+# server's peak RSS, as JSON that can be diffed across commits:
+#
+#   python Testing_tools/load_benchmark.py --requests 200 --concurrency 16 \
+#       --latency-ms 80 --error-rate 0.02 --out bench.json
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+import stub_upstream
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SERVER = os.path.join(ROOT, 'src', 'mcp_server_base.py')
+
+PASSENGER = {
+    "id": "pas_0000AEdHSpqzLsJzBE1HlA", "type": "adult", "title": "ms", "given_name": "Amelia",
+    "family_name": "Earhart", "born_on": "1987-07-24", "gender": "f",
+    "email": "amelia@example.com", "phone_number": "+442080160509",
+}
+
+
+def _day(i: int, offset: int = 0) -> str:
+    return (date(2025, 9, 1) + timedelta(days=i + offset)).isoformat()
+
+
+def _future_day(i: int) -> str:
+    """Price watches only accept dates that haven't passed."""
+    return (date.today() + timedelta(days=30 + i)).isoformat()
+
+
+def scenarios(unique: int) -> Dict[str, Callable[[int, Dict[str, Any]], Dict[str, Any]]]:
+    """
+    tool -> builder of the arguments for call i. Arguments cycle through
+    `unique` variants, so caches see a realistic mix of hits and misses.
+    """
+    u = lambda i: i % unique
+    return {
+        "search_flights": lambda i, s: {
+            "departure_id": "JFK", "arrival_id": "LAX", "outbound_date": _day(u(i)), "return_date": _day(u(i), 7),
+        },
+        "get_flight_details": lambda i, s: {"flight_id": f"flight-{u(i)}"},
+        "get_return_flights": lambda i, s: {
+            "departure_token": s["departure_tokens"][u(i) % len(s["departure_tokens"])],
+        },
+        "search_multi_city": lambda i, s: {
+            "legs": [
+                {"from": "LAX", "to": "JFK", "date": _day(u(i))},
+                {"from": "JFK", "to": "LAX", "date": _day(u(i), 5)},
+            ],
+        },
+        "optimize_multi_city": lambda i, s: {
+            "origin": "JFK", "cities": ["CDG", "FCO"], "departure_window": [_day(u(i))],
+            "min_stay_nights": 2, "max_stay_nights": 3,
+        },
+        "search_date_grid": lambda i, s: {
+            "departure_id": "JFK", "arrival_id": "LAX",
+            "outbound_range": [_day(u(i)), _day(u(i), 2)], "trip_length": 7,
+        },
+        "search_flights_multi": lambda i, s: {
+            "origins": ["NYC"], "destinations": ["LAX"], "outbound_date": _day(u(i)),
+        },
+        "search_unified": lambda i, s: {
+            "departure_id": "JFK", "arrival_id": "LAX", "outbound_date": _day(u(i)), "budget_s": 5,
+        },
+        "batch_search": lambda i, s: {
+            "requests": [
+                {"type": "one_way", "departure_id": "JFK", "arrival_id": "LAX", "outbound_date": _day(u(i))},
+                {"type": "round_trip", "departure_id": "JFK", "arrival_id": "LAX",
+                 "outbound_date": _day(u(i)), "return_date": _day(u(i), 7), "view": "compact"},
+                {"type": "multi_city", "legs": [
+                    {"from": "LAX", "to": "JFK", "date": _day(u(i))},
+                    {"from": "JFK", "to": "LAX", "date": _day(u(i), 5)},
+                ], "view": "compact"},
+                {"type": "duffel_offers", "origin": "JFK", "destination": "LAX", "departure_date": _day(u(i))},
+            ],
+        },
+        "watch_route": lambda i, s: {
+            "departure_id": "JFK", "arrival_id": "LAX", "outbound_date": _future_day(u(i)), "interval_minutes": 60,
+        },
+        "unwatch_route": lambda i, s: {"watch_id": s["unwatch_ids"][i]},
+        "list_watches": lambda i, s: {"limit": 20},
+        "get_watch_history": lambda i, s: {"watch_id": s["watch_id"]},
+        "resolve_airport": lambda i, s: {
+            "query": ["heathrow", "NYC", "sao paulo", "frankfrut", "tokyo", "SFO"][u(i) % 6],
+        },
+        "duffel_create_offer_request": lambda i, s: {
+            "origin": "JFK", "destination": "LAX", "departure_date": _day(u(i)),
+        },
+        "duffel_list_offers": lambda i, s: {
+            "offer_request_id": s["offer_request_id"], "sort": "cheapest", "limit": 50,
+            "max_offers": 200 if i % 2 else None,
+        },
+        "query_offers": lambda i, s: {
+            "offer_request_id": s["offer_request_id"], "max_price": 300 + 50 * (i % 10),
+            "max_stops": i % 2, "carriers": [["AA"], ["UA", "DL"], None][i % 3],
+        },
+        "booking_validate_or_price_offer": lambda i, s: {"offer_id": f"off_stub{u(i):05d}"},
+        "booking_list_services_and_seatmaps": lambda i, s: {"offer_id": f"off_stub{u(i):05d}"},
+        "booking_create_order": lambda i, s: {
+            "offer_id": f"off_stub{i:05d}", "passengers": [PASSENGER],
+            "payments": [{"type": "balance", "amount": "312.40", "currency": "USD"}],
+        },
+        "booking_pay_for_order": lambda i, s: {
+            "order_id": f"ord_stub{i:05d}", "amount": "312.40", "currency": "USD",
+        },
+        "booking_get_order_status": lambda i, s: {"order_id": f"ord_stub{u(i):05d}"},
+        "booking_get_orders_status": lambda i, s: {"order_ids": [f"ord_stub{u(i) + k:05d}" for k in range(20)]},
+    }
+
+
+SETUP_ATTEMPTS = 5
+
+
+async def _setup_call(session: ClientSession, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Call a setup tool, retrying failures (injected upstream errors hit setup too)."""
+    for _ in range(SETUP_ATTEMPTS):
+        result = await session.call_tool(tool, args)
+        text = "".join(getattr(c, "text", "") for c in result.content)
+        try:
+            data = json.loads(text)
+        except ValueError:
+            continue
+        if not result.isError and isinstance(data, dict) and data.get("error") is not True:
+            return data
+    raise RuntimeError(f"setup call {tool} failed {SETUP_ATTEMPTS} times; last response: {' '.join(text.split())[:200]}")
+
+
+async def setup(session: ClientSession, state: Dict[str, Any], tool: str, requests: int):
+    """Create the offer request, round-trip search and watches the other tools refer to (not measured)."""
+    created = await _setup_call(
+        session, "duffel_create_offer_request", {"origin": "JFK", "destination": "LAX", "departure_date": "2025-12-01"}
+    )
+    state["offer_request_id"] = created["offer_request_id"]
+    search = await _setup_call(
+        session, "search_flights",
+        {"departure_id": "JFK", "arrival_id": "LAX", "outbound_date": "2025-12-01", "return_date": "2025-12-08"},
+    )
+    state["departure_tokens"] = [
+        f["departure_token"] for f in search.get("best_flights", []) + search.get("other_flights", [])
+    ]
+    if not state["departure_tokens"]:
+        raise RuntimeError("setup search_flights returned no departure tokens")
+    watch = await _setup_call(
+        session, "watch_route", {"departure_id": "JFK", "arrival_id": "SFO", "outbound_date": _future_day(0)}
+    )
+    state["watch_id"] = watch["watch_id"]
+    if tool == "unwatch_route":
+        # one watch per call, each removed once
+        state["unwatch_ids"] = []
+        for i in range(requests):
+            watch = await _setup_call(
+                session, "watch_route", {"departure_id": "JFK", "arrival_id": "LAX", "outbound_date": _future_day(i % 20)}
+            )
+            state["unwatch_ids"].append(watch["watch_id"])
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[k]
+
+
+def _rss_kb(pid: int) -> Dict[str, Optional[int]]:
+    """Current and peak resident memory of a process (Linux /proc; None elsewhere)."""
+    found: Dict[str, Optional[int]] = {"VmRSS": None, "VmHWM": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key = line.split(":", 1)[0]
+                if key in found:
+                    found[key] = int(line.split()[1])
+    except OSError:
+        pass
+    return found
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, env: Dict[str, str]) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+async def drive(url: str, tool: str, build, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    sizes: List[int] = []
+    errors = 0
+    state: Dict[str, Any] = {}
+    counter = iter(range(requests))
+
+    async def worker(session: ClientSession):
+        nonlocal errors
+        for i in counter:
+            args = build(i, state)
+            started = time.perf_counter()
+            try:
+                result = await session.call_tool(tool, {k: v for k, v in args.items() if v is not None})
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            text = "".join(getattr(c, "text", "") for c in result.content)
+            sizes.append(len(text.encode()))
+            if result.isError or '"error": true' in text[:200]:
+                errors += 1
+
+    async def client(ready: asyncio.Event, go: asyncio.Event, idx: int):
+        try:
+            async with streamablehttp_client(url) as (read, write, _):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    if idx == 0:
+                        await setup(session, state, tool, requests)
+                    ready.set()
+                    await go.wait()
+                    await worker(session)
+        finally:
+            ready.set()  # also when connecting or setup failed, so drive() stops waiting
+
+    ready_events = [asyncio.Event() for _ in range(concurrency)]
+    go = asyncio.Event()
+    tasks = [asyncio.create_task(client(ready_events[i], go, i)) for i in range(concurrency)]
+    await asyncio.gather(*(e.wait() for e in ready_events))
+    failed = [t for t in tasks if t.done() and t.exception() is not None]
+    if failed:
+        # a client that couldn't connect or set up ends the run instead of leaving the others waiting
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise failed[0].exception()
+    started = time.perf_counter()
+    go.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "calls": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(_percentile(latencies, 50), 2) if latencies else None,
+        "p95_ms": round(_percentile(latencies, 95), 2) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 99), 2) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else None,
+        "response_bytes_mean": round(statistics.fmean(sizes)) if sizes else None,
+        "response_bytes_total": sum(sizes),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load benchmark for the MCP tools")
+    parser.add_argument("--requests", type=int, default=100, help="Calls per tool")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent MCP client sessions")
+    parser.add_argument("--unique", type=int, default=20, help="Distinct argument sets per tool (cache variety)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Injected upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Random +/- added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--tools", nargs="*", help="Only these tools (default: all)")
+    parser.add_argument(
+        "--keep-rate-limits", action="store_true",
+        help="Keep the server's upstream rate limits (by default they are raised so the server, not the limiter, is measured)",
+    )
+    parser.add_argument("--out", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    stub = stub_upstream.start(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status)
+    env = dict(os.environ)
+    env.update(stub_upstream.stub_env(stub))
+    env.update({"SERPAPI_API_KEY": "stub", "DUFFEL_TOKEN": "stub"})
+    watch_dir = tempfile.TemporaryDirectory()
+    env["WATCH_DB_PATH"] = os.path.join(watch_dir.name, "price_watch.sqlite3")
+    if not args.keep_rate_limits:
+        env.update({"SERPAPI_RATE": "100000", "SERPAPI_BURST": "100000", "DUFFEL_RATE": "100000", "DUFFEL_BURST": "100000"})
+
+    builders = scenarios(max(1, args.unique))
+    tools = args.tools or list(builders)
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            **{k: v for k, v in vars(args).items() if k not in ("tools", "out")},
+        },
+        "tools": {},
+    }
+
+    for tool in tools:
+        if tool not in builders:
+            print(f"no scenario for {tool}; skipping", file=sys.stderr)
+            continue
+        port = _free_port()
+        proc = start_server(port, env)
+        try:
+            before = _rss_kb(proc.pid)
+            try:
+                result = asyncio.run(
+                    drive(f"http://127.0.0.1:{port}/mcp", tool, builders[tool], args.requests, args.concurrency)
+                )
+            except Exception as e:
+                while len(getattr(e, "exceptions", ())) == 1:  # the MCP client's task groups wrap errors
+                    e = e.exceptions[0]
+                report["tools"][tool] = {"failed": f"{type(e).__name__}: {e}"}
+                print(f"{tool}: failed: {e}", file=sys.stderr)
+                continue
+            after = _rss_kb(proc.pid)
+            result["rss_start_kb"] = before["VmRSS"]
+            result["peak_rss_kb"] = after["VmHWM"]
+            report["tools"][tool] = result
+            print(f"{tool}: {result['throughput_rps']} req/s, p95 {result['p95_ms']} ms", file=sys.stderr)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    missing = sorted(set(_registered_tools()) - set(builders))
+    if missing:
+        report["meta"]["tools_without_scenario"] = missing
+
+    stub.shutdown()
+    watch_dir.cleanup()
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+
+
+def _registered_tools() -> List[str]:
+    """Names of every tool the server registers, so new tools without a scenario get flagged."""
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+    import mcp_server_base
+    return [tool.name for tool in asyncio.run(mcp_server_base.mcp.list_tools())]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# Testing_tools/projection_size_benchmark.py
+# Measures the serialized size of a search_flights response in the full and
+# compact views, using the recorded SerpAPI sample response.
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import projections
+
+SAMPLE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src', 'api_response_sample.json'))
+
+with open(SAMPLE) as f:
+    data = json.load(f)
+
+
+def size(obj) -> int:
+    return len(json.dumps(obj).encode())
+
+
+def timed(fn, runs=200) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+variants = {
+    "full": lambda: data,
+    "compact": lambda: projections.compact_search(data),
+    "compact+tokens": lambda: projections.compact_search(data, ["departure_token", "booking_token"]),
+    "compact+all": lambda: projections.compact_search(data, projections.INCLUDE_OPTIONS),
+}
+
+full_size = size(data)
+print(f"{'view':<16}{'bytes':>10}{'vs full':>10}{'project ms':>12}{'encode ms':>11}")
+for name, fn in variants.items():
+    projected = fn()
+    n = size(projected)
+    project_ms = timed(fn) if name != "full" else 0.0
+    encode_ms = timed(lambda: json.dumps(projected))
+    print(f"{name:<16}{n:>10}{n / full_size:>9.1%}{project_ms:>12.3f}{encode_ms:>11.3f}")
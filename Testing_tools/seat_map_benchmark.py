@@ -0,0 +1,144 @@
+# Testing_tools/seat_map_benchmark.py
+# Serialized size of booking_list_services_and_seatmaps seat maps in the full
+# and compact views, and the time to compact them and to find seats, for a
+# synthetic wide-body offer (several segments, several passengers, business
+# 1-2-1, premium 2-4-2 and economy 3-4-3 cabins laid out like Duffel's
+# recorded seat map). Also checks that every available seat in the compact
+# grid resolves to the service IDs of the full map. Prints JSON:
+#
+#   python Testing_tools/seat_map_benchmark.py [segments] [passengers]
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import seat_maps
+
+CABINS = [
+    # cabin_class, rows, sections (column letters per aisle block), seat prices
+    ("business", range(1, 9), ["A", "DG", "K"], ["0.00"]),
+    ("premium_economy", range(20, 27), ["AC", "DEFG", "HK"], ["0.00", "45.00"]),
+    ("economy", [r for r in range(30, 72) if r != 13], ["ABC", "DEFG", "HJK"], ["0.00", "18.00", "22.00", "35.00", "59.00"]),
+]
+EXIT_ROWS = {20, 30, 45}
+
+
+def seat_element(designator: str, column: str, passengers, prices, rng) -> dict:
+    taken = rng.random() < 0.45
+    price = rng.choice(prices)
+    return {
+        "type": "seat",
+        "designator": designator,
+        "name": "Window seat" if column in ("A", "K") else "Seat",
+        "disclosures": ["Extra legroom"] if price == prices[-1] and len(prices) > 1 else [],
+        "available_services": [] if taken else [
+            {
+                "id": f"ase_{rng.getrandbits(96):024x}",
+                "passenger_id": passenger,
+                "total_amount": price,
+                "total_currency": "USD",
+            }
+            for passenger in passengers
+        ],
+    }
+
+
+def synthetic_seat_maps(segments: int, passengers: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    passenger_ids = [f"pas_{rng.getrandbits(96):024x}" for _ in range(passengers)]
+    maps = []
+    for n in range(segments):
+        cabins = []
+        for cabin_class, rows, sections, prices in CABINS:
+            cabin_rows = []
+            for row in rows:
+                row_sections = []
+                for i, columns in enumerate(sections):
+                    elements = [seat_element(f"{row}{c}", c, passenger_ids, prices, rng) for c in columns]
+                    if row in EXIT_ROWS and i in (0, len(sections) - 1):
+                        elements.insert(0 if i == 0 else len(elements), {"type": "exit_row"})
+                    row_sections.append({"elements": elements})
+                cabin_rows.append({"sections": row_sections})
+            cabins.append({
+                "cabin_class": cabin_class,
+                "deck": 0,
+                "aisles": len(sections) - 1,
+                "wings": {"first_row_index": 10, "last_row_index": 25},
+                "rows": cabin_rows,
+            })
+        maps.append({"id": f"sea_{n:04d}", "segment_id": f"seg_{n:04d}", "slice_id": f"sli_{n // 2:04d}", "cabins": cabins})
+    return maps
+
+
+def size(obj) -> int:
+    return len(json.dumps(obj).encode())
+
+
+def timed_ms(fn, runs=20) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def check_round_trip(maps: list):
+    """Every tier character in the grids maps back to the full map's services."""
+    index = seat_maps.SeatServiceIndex()
+    index.remember("off_bench", [seat_maps.SeatMap(m) for m in maps])
+    for full in maps:
+        compacted = seat_maps.compact(seat_maps.SeatMap(full))
+        offered = {
+            element["designator"]: element["available_services"]
+            for cabin in full["cabins"] for row in cabin["rows"] for section in row["sections"]
+            for element in section["elements"] if element["type"] == "seat"
+        }
+        for cabin in compacted["cabins"]:
+            columns = cabin["columns"]
+            for row, line in zip(cabin["rows"], cabin["grid"]):
+                for column, cell in zip(columns, line):
+                    if column == seat_maps.AISLE:
+                        continue
+                    services = offered.get(f"{row}{column}")
+                    if cell in (seat_maps.TAKEN, seat_maps.NO_SEAT):
+                        assert not services, f"{row}{column} shown as {cell!r} but is offered"
+                        continue
+                    tier = compacted["prices"][seat_maps.TIER_CHARS.index(cell)]
+                    assert {s["total_amount"] for s in services} == {tier["amount"]}
+                    chosen = [{"passenger_id": s["passenger_id"], "designator": f"{row}{column}", "segment_id": full["segment_id"]} for s in services]
+                    # one passenger per resolve call: the same seat can't go to two passengers
+                    for choice, service in zip(chosen, services):
+                        assert index.resolve("off_bench", [choice])[0]["service_id"] == service["id"]
+
+
+def main():
+    segments = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    passengers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    maps = synthetic_seat_maps(segments, passengers)
+    check_round_trip(maps)
+
+    parsed = [seat_maps.SeatMap(m) for m in maps]
+    compact = [seat_maps.compact(m) for m in parsed]
+    options = [o for m in parsed for o in seat_maps.find_seats(m, together=2, position="window", max_price=40)]
+    full_bytes, compact_bytes = size(maps), size(compact)
+    print(json.dumps({
+        "segments": segments,
+        "passengers": passengers,
+        "seats": sum(1 for m in maps for c in m["cabins"] for r in c["rows"] for s in r["sections"]
+                     for e in s["elements"] if e["type"] == "seat"),
+        "full_bytes": full_bytes,
+        "compact_bytes": compact_bytes,
+        "compact_vs_full": round(compact_bytes / full_bytes, 4),
+        "seat_options_bytes": size(options),
+        # parse once per response, then compact / find seats / index from the parsed maps
+        "parse_ms": round(timed_ms(lambda: [seat_maps.SeatMap(m) for m in maps]), 3),
+        "compact_ms": round(timed_ms(lambda: [seat_maps.compact(m) for m in parsed]), 3),
+        "find_seats_ms": round(timed_ms(lambda: [seat_maps.find_seats(m, 2, "window", 40) for m in parsed]), 3),
+        "index_ms": round(timed_ms(lambda: seat_maps.SeatServiceIndex().remember("off_bench", parsed)), 3),
+        "round_trip": "ok",
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
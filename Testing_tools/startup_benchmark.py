@@ -0,0 +1,71 @@
+# Testing_tools/startup_benchmark.py
+# Cold-start cost of the server: each run starts a fresh interpreter (no
+# DUFFEL_TOKEN set) and measures importing mcp_server_base, building the
+# FastMCP server, and the first search_flights call through FastMCP against a
+# local SerpAPI stub. Prints medians as JSON.
+#
+#   python Testing_tools/startup_benchmark.py [runs]
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import stub_upstream
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+CHILD = r'''
+import asyncio, json, sys, time
+started = time.perf_counter()
+import mcp_server_base
+imported = time.perf_counter()
+sdk_loaded = "mcp.server.fastmcp" in sys.modules
+
+async def first_call():
+    built = time.perf_counter()
+    mcp_server_base.mcp.server()
+    built = time.perf_counter() - built
+    await mcp_server_base.mcp.call_tool(
+        "search_flights", {"departure_id": "JFK", "arrival_id": "LAX", "outbound_date": "2025-09-15"}
+    )
+    return built
+
+build_s = asyncio.run(first_call())
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "server_build_ms": build_s * 1000,
+    "first_tool_response_ms": (done - started) * 1000,
+    "mcp_sdk_loaded_at_import": sdk_loaded,
+}))
+'''
+
+
+def run_once(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=SRC, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    server = stub_upstream.start()
+    env = {k: v for k, v in os.environ.items() if k != "DUFFEL_TOKEN"}
+    env.update(stub_upstream.stub_env(server))
+    env["SERPAPI_API_KEY"] = "stub"
+    env["DUFFEL_TOKEN"] = ""  # also overrides a .env file: startup must not need it
+
+    samples = [run_once(env) for _ in range(runs)]
+    server.shutdown()
+
+    report = {"runs": runs, "python": sys.version.split()[0]}
+    for key in ("import_ms", "server_build_ms", "first_tool_response_ms"):
+        report[key] = round(statistics.median(s[key] for s in samples), 1)
+    report["mcp_sdk_loaded_at_import"] = any(s["mcp_sdk_loaded_at_import"] for s in samples)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# Testing_tools/stub_upstream.py
+# Local stand-in for SerpAPI and Duffel used by the benchmarks. SerpAPI requests
+# (under /serpapi/) get the recorded sample response; Duffel requests (under
+# /duffel/) are answered from the fixtures in Testing_tools/fixtures. Latency
+# and an error rate can be injected to see how the server behaves under a
+# slow or flaky upstream.
+import copy
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SAMPLE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src', 'api_response_sample.json'))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+CARRIERS = ["AA", "UA", "DL", "B6", "AS"]
+
+
+def _fixture(name: str):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+def make_offers(request_id: str, count: int) -> list:
+    """count variations of the recorded offer with distinct ids, prices, carriers and durations."""
+    template = _fixture("duffel_offer.json")
+    rng = random.Random(request_id)
+    offers = []
+    for i in range(count):
+        offer = copy.deepcopy(template)
+        carrier = CARRIERS[i % len(CARRIERS)]
+        offer["id"] = f"off_{request_id[4:]}{i:05d}"
+        offer["total_amount"] = f"{rng.uniform(120, 900):.2f}"
+        offer["owner"]["iata_code"] = carrier
+        for sl in offer["slices"]:
+            sl["duration"] = f"PT{rng.randint(5, 12)}H{rng.randint(0, 59)}M"
+            if i % 3 == 0:
+                sl["segments"] = sl["segments"][:1]  # nonstop variant
+            for seg in sl["segments"]:
+                seg["marketing_carrier"] = {"iata_code": carrier}
+        offers.append(offer)
+    return offers
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    error_rate = 0.0
+    error_status = 500
+    offers_per_request = 200
+    requests = 0
+
+    serpapi_body = b""
+    fixtures = {}
+    _offers = {}
+    _lock = threading.Lock()
+
+    def _reply(self, status: int, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the server gave up on the request (deadline or client cancellation)
+
+    def _inject(self) -> bool:
+        """Apply the configured latency; return True if this request should fail."""
+        with StubHandler._lock:
+            StubHandler.requests += 1
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            self._reply(self.error_status, {"errors": [{"type": "stub_error", "title": "Injected failure"}]})
+            return True
+        return False
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _offers_for(self, request_id: str) -> list:
+        with StubHandler._lock:
+            if request_id not in StubHandler._offers:
+                StubHandler._offers[request_id] = make_offers(request_id, self.offers_per_request)
+            return StubHandler._offers[request_id]
+
+    def do_GET(self):
+        if self._inject():
+            return
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path.startswith("/serpapi/"):
+            return self._reply(200, self.serpapi_body)
+
+        path = url.path[len("/duffel"):]
+        if path == "/air/offers":
+            offers = self._offers_for(query.get("offer_request_id", "orq_stub"))
+            if query.get("sort") == "total_amount":
+                offers = sorted(offers, key=lambda o: float(o["total_amount"]))
+            start = int(query.get("after") or 0)
+            limit = int(query.get("limit") or 50)
+            end = start + limit
+            return self._reply(200, {
+                "data": offers[start:end],
+                "meta": {"limit": limit, "after": str(end) if end < len(offers) else None, "before": None},
+            })
+        if path.startswith("/air/offers/"):
+            offer = copy.deepcopy(self.fixtures["offer"])
+            offer["id"] = path.rsplit("/", 1)[1]
+            return self._reply(200, {"data": offer})
+        if path == "/air/seat_maps":
+            return self._reply(200, {"data": [self.fixtures["seat_map"]]})
+        if path == "/air/offer_services":
+            return self._reply(200, {"data": self.fixtures["services"]})
+        if path.startswith("/air/orders/"):
+            order = dict(self.fixtures["order"], id=path.rsplit("/", 1)[1])
+            return self._reply(200, {"data": order})
+        self._reply(404, {"errors": [{"title": f"No stub for GET {path}"}]})
+
+    def do_POST(self):
+        body = self._read_body()
+        if self._inject():
+            return
+        path = urlparse(self.path).path[len("/duffel"):].lstrip("/")
+        if path == "air/offer_requests":
+            key = json.dumps(body.get("data", {}), sort_keys=True)
+            request_id = f"orq_{zlib.crc32(key.encode()):010d}"
+            return self._reply(200, {"data": {"id": request_id, "offers": self._offers_for(request_id)}})
+        if path == "air/orders":
+            return self._reply(200, {"data": self.fixtures["order"]})
+        if path == "air/payments":
+            return self._reply(200, {"data": self.fixtures["payment"]})
+        self._reply(404, {"errors": [{"title": f"No stub for POST {path}"}]})
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    # the default listen backlog of 5 drops connections at benchmark
+    # concurrency, which then wait ~1 s for a SYN retry
+    request_queue_size = 128
+
+
+def start(
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 500,
+    offers_per_request: int = 200,
+) -> ThreadingHTTPServer:
+    """Serve the stub on a free local port in a daemon thread."""
+    with open(SAMPLE, "rb") as f:
+        StubHandler.serpapi_body = f.read()
+    StubHandler.fixtures = {
+        "offer": _fixture("duffel_offer.json"),
+        "seat_map": _fixture("duffel_seat_map.json"),
+        "services": _fixture("duffel_services.json"),
+        "order": _fixture("duffel_order.json"),
+        "payment": _fixture("duffel_payment.json"),
+    }
+    StubHandler.latency_ms = latency_ms
+    StubHandler.jitter_ms = jitter_ms
+    StubHandler.error_rate = error_rate
+    StubHandler.error_status = error_status
+    StubHandler.offers_per_request = offers_per_request
+    server = _StubServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stub_env(server: ThreadingHTTPServer) -> dict:
+    """Environment variables that point the MCP server at this stub."""
+    base = f"http://127.0.0.1:{server.server_port}"
+    return {"SERPAPI_BASE": f"{base}/serpapi/", "DUFFEL_BASE": f"{base}/duffel/"}
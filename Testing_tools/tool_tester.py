@@ -1,4 +1,5 @@
 # Testing_tools/debug_import.py
+import asyncio
 import sys
 import os
 
@@ -14,5 +15,5 @@ test_legs = [
     {"from": "JFK", "to": "LAX", "date": "2025-09-20"}
 ]
 
-result = search_multi_city(test_legs)
+result = asyncio.run(search_multi_city(test_legs))
 print(result)
@@ -0,0 +1,332 @@
+import bisect
+import csv
+import difflib
+import mmap
+import os
+import re
+import struct
+import sys
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bundled worldwide airport data (airports with an IATA code), built from the
+# MIT-licensed airportsdata project; see data/AIRPORTS_LICENSE.
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "airports.bin")
+
+# File layout (little endian):
+#   header   MAGIC, version u16, airport count u32, metro count u32
+#   airports sorted by IATA code, fixed-size records (_AIRPORT)
+#   metros   sorted by metro code, fixed-size records (_METRO)
+#   strings  UTF-8 string table referenced by (offset, length) pairs
+MAGIC = b"APDB"
+VERSION = 1
+_HEADER = struct.Struct("<4sHII")
+# iata, country, metro code, lat, lon, name, city, region
+_AIRPORT = struct.Struct("<3s2s3sffIHIHIH")
+# metro code, metro name
+_METRO = struct.Struct("<3sIH")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lower-case and strip accents so "São Paulo" matches "sao paulo"."""
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AirportDB:
+    """
+    Memory-mapped airport database with a lazily built search index.
+
+    Nothing is read until first use. Exact IATA lookups bisect the mapped
+    records directly; the prefix and trigram indexes used by search() are
+    built on the first fuzzy query.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._mm: Optional[mmap.mmap] = None
+        self._count = 0
+        self._metro_count = 0
+        self._airports_at = 0
+        self._metros_at = 0
+        self._strings_at = 0
+        # search index, built on demand
+        self._vocab: Optional[List[str]] = None     # sorted distinct words
+        self._word_ids: List[array] = []            # airports containing vocab[t]
+        self._word_grams: array = array("H")        # trigram count of vocab[t]
+        self._trigram: Dict[str, array] = {}        # trigram -> vocab indexes
+        self._norm_names: List[str] = []
+        self._name_words: List[frozenset] = []
+        self._metro_members: Dict[str, List[int]] = {}
+
+    # ---------- raw access ----------
+
+    def _open(self):
+        if self._mm is not None:
+            return
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, metro_count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} airport database")
+        self._count = count
+        self._metro_count = metro_count
+        self._airports_at = _HEADER.size
+        self._metros_at = self._airports_at + count * _AIRPORT.size
+        self._strings_at = self._metros_at + metro_count * _METRO.size
+
+    def __len__(self) -> int:
+        self._open()
+        return self._count
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_at + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _code_at(self, i: int) -> bytes:
+        at = self._airports_at + i * _AIRPORT.size
+        return self._mm[at:at + 3]
+
+    def record(self, i: int) -> Dict[str, Any]:
+        self._open()
+        iata, country, metro, lat, lon, n_off, n_len, c_off, c_len, r_off, r_len = _AIRPORT.unpack_from(
+            self._mm, self._airports_at + i * _AIRPORT.size
+        )
+        return {
+            "id": iata.decode(),
+            "name": self._string(n_off, n_len),
+            "city": self._string(c_off, c_len),
+            "region": self._string(r_off, r_len),
+            "country": country.decode(),
+            "metro": metro.decode().strip() or None,
+            "lat": round(lat, 5),
+            "lon": round(lon, 5),
+        }
+
+    def _find_code(self, code: str) -> Optional[int]:
+        key = code.upper().encode()
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._code_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self._count and self._code_at(lo) == key else None
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        """Exact IATA airport lookup."""
+        self._open()
+        if len(code.strip()) != 3:
+            return None
+        i = self._find_code(code.strip())
+        return self.record(i) if i is not None else None
+
+    def metro(self, code: str) -> Optional[Dict[str, Any]]:
+        """Metro / city code (e.g. NYC, LON) with its member airports."""
+        self._build_index()
+        key = code.strip().upper()
+        members = self._metro_members.get(key)
+        if not members:
+            return None
+        lo, hi = 0, self._metro_count
+        name = None
+        while lo < hi:
+            mid = (lo + hi) // 2
+            m_code, off, length = _METRO.unpack_from(self._mm, self._metros_at + mid * _METRO.size)
+            if m_code.decode() == key:
+                name = self._string(off, length)
+                break
+            if m_code.decode() < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return {"id": key, "name": name, "airports": [self._code_at(i).decode() for i in members]}
+
+    # ---------- search ----------
+
+    def _build_index(self):
+        if self._vocab is not None:
+            return
+        self._open()
+        words: Dict[str, array] = {}
+        norm_names: List[str] = []
+        name_words: List[frozenset] = []
+        metro_members: Dict[str, List[int]] = {}
+        records = self._mm[self._airports_at:self._metros_at]
+        for i, (_, _, metro, _, _, n_off, n_len, c_off, c_len, _, _) in enumerate(_AIRPORT.iter_unpack(records)):
+            text = normalize(f"{self._string(c_off, c_len)} {self._string(n_off, n_len)}")
+            tokens = frozenset(_TOKEN_RE.findall(text))
+            norm_names.append(text)
+            name_words.append(tokens)
+            for token in tokens:
+                words.setdefault(token, array("I")).append(i)
+            if metro != b"   ":
+                metro_members.setdefault(metro.decode(), []).append(i)
+
+        vocab = sorted(words)
+        trigram: Dict[str, array] = {}
+        word_grams = array("H")
+        for t, token in enumerate(vocab):
+            grams = _trigrams(token)
+            word_grams.append(len(grams))
+            for gram in grams:
+                trigram.setdefault(gram, array("I")).append(t)
+
+        self._word_ids = [words[w] for w in vocab]
+        self._word_grams = word_grams
+        self._trigram = trigram
+        self._norm_names = norm_names
+        self._name_words = name_words
+        self._metro_members = metro_members
+        self._vocab = vocab
+
+    def _prefix_matches(self, token: str) -> set:
+        """Airports with a word starting with token."""
+        hits = set()
+        t = bisect.bisect_left(self._vocab, token)
+        while t < len(self._vocab) and self._vocab[t].startswith(token):
+            hits.update(self._word_ids[t])
+            t += 1
+        return hits
+
+    def _fuzzy_matches(self, token: str, threshold: float = 0.75) -> Dict[int, float]:
+        """
+        Airports with a word similar to token. Trigrams shortlist candidate
+        words cheaply; difflib's ratio then scores them, which copes better
+        with transpositions ("frankfrut") than trigram overlap alone.
+        """
+        grams = _trigrams(token)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for t in self._trigram.get(gram, ()):
+                shared[t] = shared.get(t, 0) + 1
+        best: Dict[int, float] = {}
+        for t, n in shared.items():
+            if n / (len(grams) + self._word_grams[t] - n) < 0.25:
+                continue
+            similarity = difflib.SequenceMatcher(None, token, self._vocab[t]).ratio()
+            if similarity >= threshold:
+                for i in self._word_ids[t]:
+                    if similarity > best.get(i, 0.0):
+                        best[i] = similarity
+        return best
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Ranked fuzzy lookup by IATA code, metro code, city or airport name.
+        Exact codes rank first, then city/name prefix matches (all query words
+        must match); if nothing matches, trigram similarity handles misspellings.
+        """
+        self._build_index()
+        q = normalize(query.strip())
+        if len(q) < 2:
+            return []
+        scores: Dict[int, float] = {}
+
+        def bump(i: int, score: float):
+            if score > scores.get(i, 0.0):
+                scores[i] = score
+
+        if len(q) == 3 and q.isalpha():
+            exact = self._find_code(q)
+            if exact is not None:
+                bump(exact, 100.0)
+            for i in self._metro_members.get(q.upper(), []):
+                bump(i, 95.0)
+
+        tokens = _TOKEN_RE.findall(q)
+        if tokens:
+            matched = None
+            for token in tokens:
+                hits = self._prefix_matches(token)
+                matched = hits if matched is None else matched & hits
+            for i in matched or ():
+                score = 80.0 if self._norm_names[i].startswith(q) else 70.0
+                if all(t in self._name_words[i] for t in tokens):
+                    score += 5.0
+                bump(i, score + self._major_bonus(i))
+
+        if not scores and tokens:
+            # Misspellings: every query word must resemble some word of the airport.
+            fuzzy: Optional[Dict[int, float]] = None
+            for token in tokens:
+                best = self._fuzzy_matches(token)
+                fuzzy = best if fuzzy is None else {i: fuzzy[i] + sim for i, sim in best.items() if i in fuzzy}
+            for i, total in fuzzy.items():
+                bump(i, 60.0 * total / len(tokens) + self._major_bonus(i))
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self._code_at(item[0])))[:limit]
+        return [{**self.record(i), "score": round(score, 1)} for i, score in ranked]
+
+    def _major_bonus(self, i: int) -> float:
+        """Small tie-breaker favouring metro-area and international airports."""
+        at = self._airports_at + i * _AIRPORT.size + 5
+        bonus = 3.0 if self._mm[at:at + 3] != b"   " else 0.0
+        return bonus + (1.0 if "international" in self._name_words[i] else 0.0)
+
+
+def build(airports_csv: str, metros_csv: str, out_path: str = DEFAULT_PATH):
+    """Build the binary database from airportsdata's airports.csv and iata_macs.csv."""
+    metro_of: Dict[str, str] = {}
+    metro_names: Dict[str, str] = {}
+    with open(metros_csv, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            metro_of[row["Airport Code"]] = row["City Code"]
+            metro_names[row["City Code"]] = row["City Name"]
+
+    rows = {}
+    with open(airports_csv, encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if len(row["iata"]) == 3 and row["iata"] not in rows:
+                rows[row["iata"]] = row
+
+    strings = bytearray()
+    string_at: Dict[str, Tuple[int, int]] = {}
+
+    def add_string(text: str) -> Tuple[int, int]:
+        if text not in string_at:
+            data = text.encode("utf-8")[:65535]
+            string_at[text] = (len(strings), len(data))
+            strings.extend(data)
+        return string_at[text]
+
+    airport_records = bytearray()
+    for code in sorted(rows):
+        row = rows[code]
+        airport_records += _AIRPORT.pack(
+            code.encode(),
+            row["country"].encode()[:2].ljust(2),
+            metro_of.get(code, "   ").encode(),
+            float(row["lat"] or 0),
+            float(row["lon"] or 0),
+            *add_string(row["name"]),
+            *add_string(row["city"]),
+            *add_string(row["subd"]),
+        )
+    metro_records = bytearray()
+    for code in sorted(metro_names):
+        metro_records += _METRO.pack(code.encode(), *add_string(metro_names[code]))
+
+    with open(out_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(rows), len(metro_names)))
+        f.write(airport_records)
+        f.write(metro_records)
+        f.write(strings)
+    return len(rows), len(metro_names)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("usage: python src/airport_db.py <airports.csv> <iata_macs.csv> [out.bin]")
+        sys.exit(1)
+    count, metros = build(*sys.argv[1:4])
+    print(f"wrote {count} airports and {metros} metro codes")
@@ -0,0 +1,97 @@
+import asyncio
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+# Absolute time.monotonic() deadline of the current tool call, if any. Tasks
+# started by the call inherit it.
+_deadline: ContextVar[Optional[float]] = ContextVar("tool_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """A tool call or one of its sub-requests ran out of time."""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (None when there is none)."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+# Part of the remaining time a fan-out hands to its sub-requests; the rest is
+# kept for merging and serializing whatever came back.
+FANOUT_SHARE = 0.9
+
+
+def share() -> Optional[float]:
+    """Budget for a sub-request started now, keeping the rest for the caller."""
+    left = remaining()
+    return None if left is None else left * FANOUT_SHARE
+
+
+def fanout() -> Callable[[], Optional[float]]:
+    """
+    Budget for the sub-requests of a fan-out that starts now and runs in
+    rounds under a concurrency limit. The fan-out ends once FANOUT_SHARE of
+    the remaining time has passed; each sub-request, asked when it gets its
+    slot, is bounded by the time left until then, so later rounds get what
+    the earlier ones left and as many rounds as fit finish.
+    """
+    left = remaining()
+    if left is None:
+        return lambda: None
+    end = time.monotonic() + left * FANOUT_SHARE
+    return lambda: max(0.0, end - time.monotonic())
+
+
+async def within(timeout_s: Optional[float], work: Awaitable[Any]) -> Any:
+    """
+    Await work under a deadline of timeout_s seconds, tightened to any
+    deadline already in force. Past the deadline the work is cancelled (which
+    aborts its upstream HTTP requests) and DeadlineExceeded is raised.
+    """
+    parent = _deadline.get()
+    deadline = parent
+    if timeout_s is not None:
+        own = time.monotonic() + max(0.0, timeout_s)
+        deadline = own if parent is None else min(parent, own)
+    if deadline is None:
+        return await work
+    token = _deadline.set(deadline)
+    try:
+        # wait_for runs work in a task that copies this context, deadline included
+        return await asyncio.wait_for(work, max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        if time.monotonic() < deadline:
+            raise  # a timeout from inside the work, not this deadline
+        budget = f" of {timeout_s:.3g}s" if timeout_s is not None else ""
+        raise DeadlineExceeded(f"deadline{budget} exceeded") from None
+    finally:
+        _deadline.reset(token)
+
+
+def accept_timeout(fn: Callable, default: Optional[float] = None) -> Callable:
+    """
+    Give a tool an optional `timeout_s` argument: the whole call, including its
+    upstream requests, is bounded by it (or by `default` when omitted).
+    """
+    sig = inspect.signature(fn, eval_str=True)
+    if "timeout_s" in sig.parameters:
+        return fn
+    params = list(sig.parameters.values())
+    params.append(inspect.Parameter("timeout_s", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=Optional[float]))
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, timeout_s: Optional[float] = None, **kwargs):
+            return await within(timeout_s if timeout_s is not None else default, fn(*args, **kwargs))
+    else:
+        # sync tools are local lookups with no upstream work to bound
+        @functools.wraps(fn)
+        def wrapper(*args, timeout_s: Optional[float] = None, **kwargs):
+            return fn(*args, **kwargs)
+
+    wrapper.__signature__ = sig.replace(parameters=params)
+    return wrapper
@@ -0,0 +1,117 @@
+import functools
+import inspect
+import json
+import time
+from collections.abc import Mapping
+from typing import Any, Callable, Iterator, Optional, Union
+
+try:
+    import orjson  # optional: several times faster than the json module
+    BACKEND = "orjson"
+except ImportError:
+    orjson = None
+    BACKEND = "json"
+
+_parse_observer: Optional[Callable[[float], None]] = None
+
+
+def observe_parse(fn: Optional[Callable[[float], None]]):
+    """Call fn(seconds) after every Document parse (metrics charges it to the current tool call)."""
+    global _parse_observer
+    _parse_observer = fn
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Document):
+        return obj.data
+    return str(obj)  # same fallback FastMCP's encoder uses
+
+
+def dumps(value: Any, indent: bool = False) -> bytes:
+    """JSON bytes; indent=True matches FastMCP's two-space tool output."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(value, default=_default, option=option)
+    if indent:
+        return json.dumps(value, default=_default, indent=2, ensure_ascii=False).encode()
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class Document(Mapping):
+    """
+    An upstream JSON response body, kept as the bytes it arrived as and
+    parsed only when something reads from it. Tools that return a response
+    unchanged hand the bytes straight to the client and the response cache
+    stores them as-is, so an untransformed response is never parsed or
+    re-encoded. It reads like the dict response.json() used to return.
+    """
+
+    __slots__ = ("raw", "_data")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._data: Any = None
+
+    @property
+    def parsed(self) -> bool:
+        return self._data is not None
+
+    @property
+    def data(self) -> Any:
+        if self._data is None:
+            started = time.perf_counter()
+            self._data = loads(self.raw)
+            if _parse_observer is not None:
+                _parse_observer(time.perf_counter() - started)
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        return self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"Document({len(self.raw)} bytes{', parsed' if self.parsed else ''})"
+
+
+def encode(value: Any) -> bytes:
+    """Compact JSON bytes of a value; a Document's own bytes."""
+    return value.raw if isinstance(value, Document) else dumps(value)
+
+
+def size(value: Any) -> int:
+    return len(value.raw) if isinstance(value, Document) else len(dumps(value))
+
+
+def tool_text(value: Any) -> Any:
+    """
+    Serialize a tool result the way FastMCP would (two-space JSON text), but
+    with the fast encoder, and without re-encoding an untouched Document.
+    Lists are left to FastMCP, which turns each item into its own content block.
+    """
+    if isinstance(value, Document):
+        return value.raw.decode()
+    if isinstance(value, dict):
+        return dumps(value, indent=True).decode()
+    return value
+
+
+def encode_tool_result(fn: Callable) -> Callable:
+    """Wrap a tool so its result reaches FastMCP already serialized by tool_text()."""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return tool_text(await fn(*args, **kwargs))
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return tool_text(fn(*args, **kwargs))
+    return wrapper
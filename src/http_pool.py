@@ -0,0 +1,99 @@
+import asyncio
+import os
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx when installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+MAX_CONNECTIONS = _env_int("UPSTREAM_MAX_CONNECTIONS", 100)
+MAX_KEEPALIVE_CONNECTIONS = _env_int("UPSTREAM_MAX_KEEPALIVE", 20)
+KEEPALIVE_EXPIRY = _env_float("UPSTREAM_KEEPALIVE_EXPIRY", 30.0)
+CONNECT_TIMEOUT = _env_float("UPSTREAM_CONNECT_TIMEOUT", 10.0)
+
+# provider -> callable returning (base_url, default read timeout in seconds)
+_providers: Dict[str, Callable[[], Tuple[str, float]]] = {}
+# provider -> (event loop the client is bound to, client)
+_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+
+
+def register_provider(name: str, settings: Callable[[], Tuple[str, float]]):
+    """
+    Register an upstream so get_client() can build its pool lazily.
+    settings() returns (base_url, timeout) and is only called when the pool is
+    built, so configuration is read on first use rather than at import.
+    """
+    _providers[name] = settings
+
+
+def _build_client(name: str) -> httpx.AsyncClient:
+    base_url, timeout = _providers[name]()
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+    )
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """
+    Return the shared AsyncClient for a provider, creating it on first use.
+    Clients are tied to the event loop they were created on, so a new one is
+    built if the caller runs on a different loop (e.g. repeated asyncio.run()).
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(name)
+    if entry is not None:
+        client_loop, client = entry
+        if client_loop is loop and not client.is_closed:
+            return client
+    client = _build_client(name)
+    _clients[name] = (loop, client)
+    return client
+
+
+async def aclose_all():
+    """Close every pooled client bound to the running loop."""
+    loop = asyncio.get_running_loop()
+    for name, (client_loop, client) in list(_clients.items()):
+        if client_loop is loop:
+            await client.aclose()
+        _clients.pop(name, None)
+
+
+def pool_stats() -> Dict[str, Optional[dict]]:
+    """Basic view of the configured pools, for diagnostics."""
+    stats = {}
+    for name, settings in _providers.items():
+        base_url, timeout = settings()
+        stats[name] = {
+            "base_url": base_url,
+            "timeout": timeout,
+            "open": name in _clients and not _clients[name][1].is_closed,
+            "http2": HTTP2_AVAILABLE,
+        }
+    return stats
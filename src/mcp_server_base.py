@@ -1,25 +1,276 @@
+import inspect
 import json
-from mcp.server.fastmcp import FastMCP
 import os
+import time
+import asyncio
 import httpx 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from typing import List, Dict, Optional,Any
-import requests
+from typing import TYPE_CHECKING, List, Dict, Optional,Any, AsyncIterator, Callable, Tuple
+import deadlines
+import fastjson
+import http_pool
+import metrics
+import order_snapshots
+import response_cache
+import singleflight
+import projections
+import return_prefetch
+import route_optimizer
+import seat_maps
+import upstream_scheduler
+from upstream_scheduler import PRIORITY_BACKGROUND, PRIORITY_BOOKING, PRIORITY_PAYMENT, PRIORITY_SEARCH
+
+if TYPE_CHECKING:
+    from mcp.server.fastmcp import FastMCP, Context
+    import airport_db
+    import offer_store
+    import price_watch
 load_dotenv()
 
-mcp = FastMCP("Google Flights MCP")
-DUFFEL_TOKEN = os.getenv("DUFFEL_TOKEN")
+
+class _DeferredMCP:
+    """
+    Collects @mcp.tool() / @mcp.resource() registrations and builds the
+    FastMCP server on first use. Importing this module (e.g. to call a tool
+    directly from a script) therefore doesn't import the MCP SDK, which is
+    most of the server's cold-start time. Every MCP tool call is timed by
+    metrics.observe_call(). Any other attribute is forwarded to the built server.
+    """
+
+    def __init__(self, name: str, **settings):
+        self._name = name
+        self._settings = settings
+        self._registrations: List[tuple] = []
+        self._server: Optional["FastMCP"] = None
+
+    def _register(self, kind: str, args: tuple, kwargs: dict):
+        def decorator(fn):
+            self._registrations.append((kind, fn, args, kwargs))
+            if self._server is not None:
+                self._add(self._server, kind, fn, args, kwargs)
+            return fn
+        return decorator
+
+    @staticmethod
+    def _add(server: "FastMCP", kind: str, fn, args: tuple, kwargs: dict):
+        # Tools are registered wrapped: they take an optional timeout_s, their
+        # run time is measured, and their result is serialized by fastjson
+        # (untouched upstream responses pass through as their raw bytes). The
+        # module keeps the plain functions, so tools calling each other aren't
+        # counted twice and get dicts back.
+        if kind == "tool":
+            fn = fastjson.encode_tool_result(metrics.instrument_tool(deadlines.accept_timeout(fn, TOOL_TIMEOUT_S)))
+        getattr(server, kind)(*args, **kwargs)(fn)
+
+    def tool(self, *args, **kwargs):
+        return self._register("tool", args, kwargs)
+
+    def resource(self, *args, **kwargs):
+        return self._register("resource", args, kwargs)
+
+    def custom_route(self, *args, **kwargs):
+        return self._register("custom_route", args, kwargs)
+
+    def server(self) -> "FastMCP":
+        if self._server is None:
+            from mcp.server.fastmcp import FastMCP, Context
+            # tool signatures refer to Context by name; FastMCP resolves it from module globals
+            globals()["Context"] = Context
+
+            class InstrumentedFastMCP(FastMCP):
+                async def call_tool(self, name: str, arguments: Dict[str, Any]):
+                    run = super().call_tool
+                    return await metrics.observe_call(name, arguments, lambda: run(name, arguments))
+
+            server = InstrumentedFastMCP(self._name, **self._settings)
+            for kind, fn, args, kwargs in self._registrations:
+                self._add(server, kind, fn, args, kwargs)
+            self._server = server
+        return self._server
+
+    def __getattr__(self, name: str):
+        return getattr(self.server(), name)
+
+
+mcp = _DeferredMCP("Google Flights MCP", host="127.0.0.1", port=8000, log_level="INFO")
+# Deadline applied to tool calls that don't pass timeout_s (unset: none).
+TOOL_TIMEOUT_S = http_pool._env_float("TOOL_TIMEOUT_S", 0.0) or None
 DUFFEL_VERSION = "v2"
-DUFFEL_BASE = "https://api.duffel.com/"
-if not DUFFEL_TOKEN:
-    raise ValueError("DUFFEL_TOKEN is not set. Please set it in the .env file.")
 
 
-@mcp.resource("mcp://airports")
-def get_airports():
-    """Get a list of airports."""
-    airports =        [
+def _duffel_token() -> str:
+    """Read the Duffel token on first use so search-only deployments can start without one."""
+    token = os.getenv("DUFFEL_TOKEN")
+    if not token:
+        raise ValueError("DUFFEL_TOKEN is not set. Please set it in the .env file.")
+    return token
+
+
+# Base URLs and timeouts are read when each provider's pool is first built.
+# SerpAPI searches routinely take several seconds, so give them more headroom.
+http_pool.register_provider(
+    "serpapi",
+    lambda: (os.getenv("SERPAPI_BASE", "https://serpapi.com/"), http_pool._env_float("SERPAPI_TIMEOUT", 60.0)),
+)
+http_pool.register_provider(
+    "duffel",
+    lambda: (os.getenv("DUFFEL_BASE", "https://api.duffel.com/"), http_pool._env_float("DUFFEL_TIMEOUT", 45.0)),
+)
+
+
+# tool -> (ttl, stale-while-revalidate window) in seconds
+CACHE_TTLS = {
+    "search_flights": (http_pool._env_float("CACHE_TTL_SEARCH", 300.0), http_pool._env_float("CACHE_STALE_SEARCH", 600.0)),
+    "search_multi_city": (http_pool._env_float("CACHE_TTL_SEARCH", 300.0), http_pool._env_float("CACHE_STALE_SEARCH", 600.0)),
+    "get_flight_details": (http_pool._env_float("CACHE_TTL_DETAILS", 900.0), http_pool._env_float("CACHE_STALE_DETAILS", 900.0)),
+    # departure tokens are short-lived, so return legs are never served stale
+    "get_return_flights": (http_pool._env_float("CACHE_TTL_RETURNS", 300.0), 0.0),
+}
+search_cache = response_cache.TTLCache(
+    max_entries=http_pool._env_int("CACHE_MAX_ENTRIES", 512),
+    max_bytes=http_pool._env_int("CACHE_MAX_BYTES", 64 * 1024 * 1024),
+)
+
+
+def configure_cache(backend: str = "memory", path: Optional[str] = None):
+    """
+    Select the search/detail response cache backend.
+    "memory" is per process; "sqlite" is an on-disk cache that every server
+    process on the host shares (see sqlite_cache.SQLiteCache).
+    """
+    global search_cache
+    if backend == "sqlite":
+        import sqlite_cache
+        search_cache = sqlite_cache.SQLiteCache(
+            path or os.getenv("CACHE_PATH", os.path.join(os.getcwd(), ".cache", "flights_cache.sqlite3")),
+            max_bytes=http_pool._env_int("CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024),
+        )
+    elif backend != "memory":
+        raise ValueError(f"Unknown cache backend: {backend}")
+
+
+# Coalesces identical in-flight idempotent upstream requests. Never used for
+# order creation or payments.
+inflight = singleflight.SingleFlight()
+
+
+async def _coalesce(key: str, fn):
+    """inflight.do(), counting calls that joined a request already in flight."""
+    if key in inflight:
+        metrics.record("coalesced")
+    return await inflight.do(key, fn)
+
+
+_airport_index: Optional["airport_db.AirportDB"] = None
+
+
+def airport_index() -> "airport_db.AirportDB":
+    """Worldwide airport database; imported, memory-mapped and indexed on first use."""
+    global _airport_index
+    if _airport_index is None:
+        import airport_db
+        _airport_index = airport_db.AirportDB()
+    return _airport_index
+
+
+def _env_limit(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+# Rate limits, priorities and 429 backoff for every upstream request.
+scheduler = upstream_scheduler.UpstreamScheduler(max_retries=http_pool._env_int("UPSTREAM_MAX_RETRIES", 3))
+scheduler.add_provider(
+    "serpapi",
+    rate=http_pool._env_float("SERPAPI_RATE", 5.0),
+    burst=http_pool._env_float("SERPAPI_BURST", 10.0),
+    credit_limit=_env_limit("SERPAPI_CREDIT_LIMIT"),
+)
+scheduler.add_provider(
+    "duffel",
+    rate=http_pool._env_float("DUFFEL_RATE", 10.0),
+    burst=http_pool._env_float("DUFFEL_BURST", 20.0),
+    credit_limit=_env_limit("DUFFEL_REQUEST_LIMIT"),
+)
+
+
+_offer_index: Optional["offer_store.OfferStore"] = None
+
+
+def offer_index() -> "offer_store.OfferStore":
+    """Offers fetched from Duffel, indexed for query_offers; created on first Duffel search."""
+    global _offer_index
+    if _offer_index is None:
+        import offer_store
+        _offer_index = offer_store.OfferStore(max_offers=http_pool._env_int("OFFER_STORE_MAX_OFFERS", 20000))
+    return _offer_index
+
+
+class SerpApiError(Exception):
+    """Non-200 response from SerpAPI."""
+
+
+def _iata(code: str) -> str:
+    return code.strip().upper()
+
+
+def _canonical_date(value: Optional[str]) -> Optional[str]:
+    """Normalize a date to YYYY-MM-DD; leave it untouched if it can't be parsed."""
+    if not value:
+        return value
+    value = value.strip()
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y%m%d"):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+async def _serpapi_fetch(params: Dict[str, Any], priority: int = PRIORITY_SEARCH) -> Dict[str, Any]:
+    client = http_pool.get_client("serpapi")
+    try:
+        response = await scheduler.request(
+            "serpapi", priority, lambda: metrics.upstream(client.get("search", params=params))
+        )
+    except upstream_scheduler.QuotaExceeded as e:
+        raise SerpApiError(str(e))
+    if response.status_code != 200:
+        raise SerpApiError(f"API Error: {response.status_code} - {response.text}")
+    return metrics.decode(response)
+
+
+async def serpapi_get(
+    params: Dict[str, Any],
+    cache_tool: Optional[str] = None,
+    priority: int = PRIORITY_SEARCH,
+    allow_stale: bool = True
+) -> Dict[str, Any]:
+    """
+    GET /search on SerpAPI through the shared connection pool and scheduler.
+    When cache_tool is given the response is cached under that tool's TTLs;
+    allow_stale=False skips entries past their TTL instead of serving them.
+    """
+    key = response_cache.make_key(f"serpapi:{cache_tool or 'search'}", params)
+    fetched = False
+
+    async def fetch():
+        nonlocal fetched
+        fetched = True
+        return await _coalesce(key, lambda: _serpapi_fetch(params, priority))
+
+    if cache_tool is None:
+        return await fetch()
+    ttl, stale = CACHE_TTLS[cache_tool]
+    data = await search_cache.get_or_fetch(key, fetch, ttl, stale, allow_stale)
+    metrics.record("cache_misses" if fetched else "cache_hits")
+    return data
+
+
+# Popular US airports served by the mcp://airports resource. The full
+# worldwide dataset lives in data/airports.bin (see resolve_airport).
+AIRPORTS = [
     {"id": "ATL", "name": "Hartsfield–Jackson Atlanta International Airport", "city": "Atlanta"},
     {"id": "DFW", "name": "Dallas/Fort Worth International Airport", "city": "Dallas–Fort Worth"},
     {"id": "DEN", "name": "Denver International Airport", "city": "Denver"},
@@ -50,27 +301,117 @@ def get_airports():
     {"id": "RDU", "name": "Raleigh–Durham International Airport", "city": "Raleigh/Durham"}
 ]
 
-    return airports
+
+@mcp.resource("mcp://airports")
+def get_airports():
+    """Get a list of airports."""
+    return AIRPORTS
+
+
+@mcp.resource("mcp://scheduler")
+def get_scheduler_stats():
+    """Queue depth, rate-limit tokens, backoff state and remaining budget per upstream."""
+    return scheduler.stats()
+
+
+def _runtime_gauges():
+    """Cache, coalescing and scheduler state as (name, help, labels, value) gauges."""
+    cache = search_cache.stats()
+    for key in ("entries", "bytes", "hits", "stale_hits", "misses", "evictions", "hit_rate"):
+        if key in cache:
+            yield f"mcp_cache_{key}", f"Response cache {key.replace('_', ' ')}.", {"backend": cache["backend"]}, cache[key]
+    for key, value in inflight.stats().items():
+        yield f"mcp_coalescing_{key}", f"Single-flight {key.replace('_', ' ')}.", {}, value
+    for provider, state in scheduler.stats().items():
+        for key in ("queue_depth", "tokens_available", "requests_sent", "retries", "throttled"):
+            yield f"mcp_upstream_{key}", f"Upstream scheduler {key.replace('_', ' ')}.", {"provider": provider}, state[key]
+    for key, value in return_prefetcher.stats().items():
+        yield f"mcp_return_prefetch_{key}", f"Return-leg prefetch {key.replace('_', ' ')}.", {}, value
+    offers = validated_offers.stats()
+    for key in ("entries", "bytes", "hits", "misses", "evictions", "hit_rate"):
+        yield f"mcp_offer_cache_{key}", f"Validated-offer cache {key}.", {}, offers[key]
+    for key, value in seat_services.stats().items():
+        yield f"mcp_seat_index_{key}", f"Seat service index {key.replace('_', ' ')}.", {}, value
+    for key, value in order_state.stats().items():
+        yield f"mcp_order_snapshots_{key}", f"Order status snapshots {key.replace('_', ' ')}.", {}, value
+    if _price_watcher is not None:
+        for key, value in _price_watcher.stats().items():
+            yield f"mcp_price_watch_{key}", f"Price-watch engine {key.replace('_', ' ')}.", {}, value
+
+
+@mcp.resource("mcp://metrics", mime_type="text/plain")
+def get_metrics():
+    """Per-tool call counts, errors, latency by phase, sizes and cache/coalescing hits (Prometheus text)."""
+    return metrics.render(_runtime_gauges())
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    """Prometheus scrape endpoint on the server's HTTP port."""
+    from starlette.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render(_runtime_gauges()), media_type="text/plain; version=0.0.4")
+
+
+@mcp.resource("mcp://cache/stats")
+def get_cache_stats():
+    """Hit, miss and eviction counters for the search response cache."""
+    return {
+        **search_cache.stats(),
+        "coalescing": inflight.stats(),
+        "offer_store": offer_index().stats(),
+        "return_prefetch": return_prefetcher.stats(),
+        "validated_offers": validated_offers.stats(),
+    }
 
 
 
 @mcp.tool()
-def search_flights(
+async def search_flights(
     departure_id: str,
     arrival_id: str,
     outbound_date: str,
     return_date: Optional[str] = None, 
     travel_class: str = "economy",
-    adults: int = 1
+    adults: int = 1,
+    view: str = "full",
+    include: Optional[List[str]] = None,
+    prefetch_returns: int = 0
 ):
 
-    """Search for flights between two airports."""
+    """
+    Search for flights between two airports.
+    view="compact" returns a slim summary per itinerary (price, duration, stops,
+    carriers, flight numbers, times, emissions). Tokens, logos, extensions,
+    search_metadata and price_history are dropped unless named in include.
+    For round trips, prefetch_returns=N fetches the return flights of the top
+    N outbound options in the background, so get_return_flights(departure_token)
+    usually answers from cache (compact views need include=["departure_token"]).
+    """
+    projections.check_view(view, include)
     
     api_key = os.getenv("SERPAPI_API_KEY")
     if not api_key:
         raise ValueError("API key not found. Please set the SERPAPI_API_KEY environment variable.")
     
-    base_url = "https://serpapi.com/search"
+    params = _flight_search_params(departure_id, arrival_id, outbound_date, return_date, travel_class, adults, api_key)
+    data = await serpapi_get(params, cache_tool="search_flights")
+    if params["return_date"]:
+        _register_departure_tokens(data, params, prefetch_returns)
+    return projections.compact_search(data, include or ()) if view == "compact" else data
+
+
+def _flight_search_params(
+    departure_id: str,
+    arrival_id: str,
+    outbound_date: str,
+    return_date: Optional[str],
+    travel_class: str,
+    adults: int,
+    api_key: Optional[str],
+) -> Dict[str, Any]:
+    """Normalized SerpAPI params of a search_flights query (shared by price watches, so they share its cache)."""
+    departure_id, arrival_id = _iata(departure_id), _iata(arrival_id)
+    outbound_date, return_date = _canonical_date(outbound_date), _canonical_date(return_date)
     if return_date:
         params = {
             "engine": "google_flights",
@@ -95,47 +436,89 @@ def search_flights(
             "type": 2,  # 2 for one way
             "api_key": api_key
         }
-    
-    with httpx.Client() as client:
-        response = client.get(base_url, params=params)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        # Fixed: Corrected syntax error
-        raise Exception(f"API Error: {response.status_code} - {response.text}")
+    return params
+
+
+RETURN_PREFETCH_MAX = http_pool._env_int("RETURN_PREFETCH_MAX", 5)
+return_prefetcher = return_prefetch.ReturnPrefetcher(
+    concurrency=http_pool._env_int("RETURN_PREFETCH_CONCURRENCY", 2),
+    budget=http_pool._env_float("RETURN_PREFETCH_BUDGET", 100.0),
+    window_s=http_pool._env_float("RETURN_PREFETCH_WINDOW", 3600.0),
+    ttl=CACHE_TTLS["get_return_flights"][0],
+)
+
+
+def _return_params(departure_token: str) -> Dict[str, Any]:
+    """SerpAPI params for the return flights of an outbound option: its search plus the token."""
+    search = return_prefetcher.search_for(departure_token)
+    if search is None:
+        raise ValueError(
+            "Unknown or expired departure_token. Run a round-trip search_flights first and use a token from it."
+        )
+    api_key = os.getenv("SERPAPI_API_KEY")
+    if not api_key:
+        raise ValueError("API key not found. Please set the SERPAPI_API_KEY environment variable.")
+    return {**search, "departure_token": departure_token, "api_key": api_key}
+
+
+def _register_departure_tokens(data: Dict[str, Any], params: Dict[str, Any], prefetch: int):
+    """Remember where each outbound option's token came from; prefetch the top `prefetch` return legs."""
+    search = {k: v for k, v in params.items() if k != "api_key"}
+    tokens = [
+        itinerary["departure_token"]
+        for itinerary in data.get("best_flights", []) + data.get("other_flights", [])
+        if itinerary.get("departure_token")
+    ]
+    for token in tokens:
+        return_prefetcher.remember(token, search)
+    if prefetch > 0:
+        started = return_prefetcher.schedule(
+            tokens[:min(prefetch, RETURN_PREFETCH_MAX)],
+            lambda token: serpapi_get(_return_params(token), cache_tool="get_return_flights", priority=PRIORITY_BACKGROUND),
+        )
+        metrics.record("return_prefetches", started)
+
+
+@mcp.tool()
+async def get_return_flights(departure_token: str, view: str = "full", include: Optional[List[str]] = None):
+    """
+    Return flights for one outbound option of a round-trip search_flights
+    result, identified by its departure_token. Supports the same view/include
+    options as search_flights.
+    """
+    projections.check_view(view, include)
+    data = await serpapi_get(_return_params(departure_token.strip()), cache_tool="get_return_flights")
+    return projections.compact_search(data, include or ()) if view == "compact" else data
 
 # ... rest of your tools remain the same
 @mcp.tool()
-def get_flight_details(flight_id: str):
-    """Get details for a specific flight."""
+async def get_flight_details(flight_id: str, view: str = "full", include: Optional[List[str]] = None):
+    """Get details for a specific flight. Supports the same view/include options as search_flights."""
+    projections.check_view(view, include)
     
     api_key = os.getenv("SERPAPI_API_KEY")
     if not api_key:
         raise ValueError("API key not found. Please set the SERPAPI_API_KEY environment variable.")
     
-    base_url = "https://serpapi.com/search"
     params = {
         "engine": "google_flights",
-        "flight_id": flight_id,
+        "flight_id": flight_id.strip(),
         "api_key": api_key
     }
     
-    with httpx.Client() as client:
-        response = client.get(base_url, params=params)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"API Error: {response.status_code} - {response.text}")
+    data = await serpapi_get(params, cache_tool="get_flight_details")
+    return projections.compact_search(data, include or ()) if view == "compact" else data
 
 @mcp.tool()
-def search_multi_city(
+async def search_multi_city(
     legs: List[Dict], 
     travel_class: str = "economy",
-    adults: int = 1
+    adults: int = 1,
+    view: str = "full",
+    include: Optional[List[str]] = None
 ):
-    """Search for multi-city/complex itinerary flights using SERP API"""
+    """Search for multi-city/complex itinerary flights using SERP API. Supports view="compact" like search_flights."""
+    projections.check_view(view, include)
     api_key = os.getenv("SERPAPI_API_KEY")
     if not api_key:
         raise ValueError("SERP API key is required")
@@ -143,8 +526,6 @@ def search_multi_city(
     if len(legs) < 2:
         raise ValueError("Multi-city search requires at least 2 legs")
     
-    base_url = "https://serpapi.com/search"
-    
    
     travel_class_map = {
         "economy": "1",
@@ -156,9 +537,9 @@ def search_multi_city(
     multi_city_data = []
     for leg in legs:
         multi_city_data.append({
-            "departure_id": leg["from"],
-            "arrival_id": leg["to"],
-            "date": leg["date"]
+            "departure_id": _iata(leg["from"]),
+            "arrival_id": _iata(leg["to"]),
+            "date": _canonical_date(leg["date"])
         })
     
     params = {
@@ -171,10 +552,15 @@ def search_multi_city(
     }
     
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = await serpapi_get(params, cache_tool="search_multi_city")
+
+        if view == "compact":
+            compact = projections.compact_search(data, include or ())
+            return {
+                "search_completed": True,
+                "total_legs": len(legs),
+                "multi_city_results": {**compact, "legs_info": legs}
+            }
 
         result = {
             "search_completed": True,
@@ -190,8 +576,8 @@ def search_multi_city(
         
         return result
         
-    except requests.exceptions.RequestException as e:
-        print(f"Error in multi-city search: {e}")
+    except (httpx.HTTPError, SerpApiError) as e:
+        metrics.logger().warning("multi_city_search_failed", legs=len(legs), error=str(e))
         return {
             "search_completed": False,
             "total_legs": len(legs),
@@ -199,7 +585,375 @@ def search_multi_city(
             "error": str(e)
         }
 
-def _safe_err(e: requests.HTTPError):
+GRID_CONCURRENCY = http_pool._env_int("GRID_CONCURRENCY", 8)
+GRID_MAX_CELLS = http_pool._env_int("GRID_MAX_CELLS", 60)
+OPTIMIZE_MAX_CITIES = http_pool._env_int("OPTIMIZE_MAX_CITIES", 6)
+OPTIMIZE_MAX_LEGS = http_pool._env_int("OPTIMIZE_MAX_LEGS", 80)
+OPTIMIZE_WAVE = http_pool._env_int("OPTIMIZE_WAVE", 4)
+
+
+def _date_range(date_range: List[str]) -> List[str]:
+    """Expand [start, end] (inclusive) into a list of YYYY-MM-DD dates."""
+    if not date_range or len(date_range) > 2:
+        raise ValueError("Date range must be [start] or [start, end]")
+    start = datetime.strptime(_canonical_date(date_range[0]), "%Y-%m-%d").date()
+    end = datetime.strptime(_canonical_date(date_range[-1]), "%Y-%m-%d").date()
+    if end < start:
+        raise ValueError(f"Date range end {end} is before start {start}")
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def _cheapest_itinerary(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Pick the lowest-priced itinerary from a Google Flights response, in compact form."""
+    options = [f for f in data.get("best_flights", []) + data.get("other_flights", []) if f.get("price") is not None]
+    if not options:
+        return None
+    return projections.compact_itinerary(min(options, key=lambda f: f["price"]))
+
+
+@mcp.tool()
+async def search_date_grid(
+    departure_id: str,
+    arrival_id: str,
+    outbound_range: List[str],
+    return_range: Optional[List[str]] = None,
+    trip_length: Optional[int] = None,
+    travel_class: str = "economy",
+    adults: int = 1,
+    max_concurrency: int = GRID_CONCURRENCY
+):
+    """
+    Find the cheapest day to fly within a date window.
+    outbound_range / return_range are [start, end] dates (inclusive). Give either
+    return_range or trip_length (days) for round trips, or neither for one-way.
+    Searches run concurrently (at most max_concurrency at a time) and the result
+    is a price matrix of outbound dates x return dates plus the cheapest cell.
+    """
+    if return_range and trip_length is not None:
+        raise ValueError("Pass either return_range or trip_length, not both")
+
+    outbound_dates = _date_range(outbound_range)
+    return_dates = _date_range(return_range) if return_range else None
+    # one row per outbound date; each row holds the return date for every column
+    rows = []
+    for o in outbound_dates:
+        if return_dates:
+            rows.append(return_dates)
+        elif trip_length is not None:
+            rows.append([(datetime.strptime(o, "%Y-%m-%d") + timedelta(days=trip_length)).date().isoformat()])
+        else:
+            rows.append([None])
+
+    searchable = [(o, r) for o, row in zip(outbound_dates, rows) for r in row if r is None or r >= o]
+    if len(searchable) > GRID_MAX_CELLS:
+        raise ValueError(f"Grid has {len(searchable)} searches; the limit is {GRID_MAX_CELLS}. Narrow the date ranges.")
+
+    concurrency = max(1, min(max_concurrency, GRID_CONCURRENCY * 4))
+    semaphore = asyncio.Semaphore(concurrency)
+    budget = deadlines.fanout()
+
+    async def price_cell(outbound_date: str, return_date: Optional[str]) -> Dict[str, Any]:
+        cell = {"outbound_date": outbound_date, "return_date": return_date}
+        async with semaphore:
+            try:
+                # bounded by what is left of the fan-out once the cell gets its turn,
+                # so a slow cell times out on its own instead of taking the grid down
+                data = await deadlines.within(budget(), search_flights(
+                    departure_id, arrival_id, outbound_date, return_date, travel_class, adults
+                ))
+            except deadlines.DeadlineExceeded as e:
+                cell["error"] = str(e)
+                cell["timed_out"] = True
+                return cell
+            except (httpx.HTTPError, SerpApiError) as e:
+                cell["error"] = str(e)
+                return cell
+        cell["itinerary"] = _cheapest_itinerary(data)
+        cell["price"] = cell["itinerary"]["price"] if cell["itinerary"] else None
+        cell["lowest_price"] = data.get("price_insights", {}).get("lowest_price")
+        return cell
+
+    started = time.perf_counter()
+    cells = await asyncio.gather(*(price_cell(o, r) for o, r in searchable))
+    by_pair = {(c["outbound_date"], c["return_date"]): c for c in cells}
+
+    matrix = [[by_pair.get((o, r), {}).get("price") for r in row] for o, row in zip(outbound_dates, rows)]
+
+    priced = [c for c in cells if c.get("price") is not None]
+    return {
+        "outbound_dates": outbound_dates,
+        "return_dates": return_dates,
+        "trip_length": trip_length,
+        "matrix": matrix,
+        "cells": cells,
+        "cheapest": min(priced, key=lambda c: c["price"]) if priced else None,
+        "searches": len(searchable),
+        "errors": sum(1 for c in cells if "error" in c),
+        "timeouts": sum(1 for c in cells if c.get("timed_out")),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+@mcp.tool()
+async def optimize_multi_city(
+    origin: str,
+    cities: List[str],
+    departure_window: List[str],
+    min_stay_nights: int = 2,
+    max_stay_nights: int = 4,
+    stays: Optional[Dict[str, List[int]]] = None,
+    return_to_origin: bool = True,
+    latest_return: Optional[str] = None,
+    travel_class: str = "economy",
+    adults: int = 1,
+    max_legs: int = OPTIMIZE_MAX_LEGS
+):
+    """
+    Cheapest order and dates to visit every city in `cities` (IATA codes) from
+    `origin`, leaving within departure_window ([start, end] dates) and staying
+    min_stay_nights..max_stay_nights in each city (per-city overrides in
+    stays, e.g. {"FCO": [3, 5]}). Ends back at origin unless return_to_origin
+    is false, by latest_return if given.
+    Legs are priced as one-way searches only when the search needs them (at
+    most max_legs); the result reports how many searches that saved against
+    pricing every possible leg. When the call's deadline (timeout_s) runs out,
+    unpriced legs count as unavailable and the best trip found so far is
+    returned with complete=false.
+    """
+    origin = _iata(origin)
+    cities = list(dict.fromkeys(_iata(c) for c in cities))
+    if not cities:
+        raise ValueError("cities must name at least one airport")
+    if len(cities) > OPTIMIZE_MAX_CITIES:
+        raise ValueError(f"At most {OPTIMIZE_MAX_CITIES} cities can be optimized at once")
+    if origin in cities:
+        raise ValueError("origin can't also be one of the cities to visit")
+    stay_nights = {city: (min_stay_nights, max_stay_nights) for city in cities}
+    for city, bounds in (stays or {}).items():
+        if _iata(city) not in stay_nights or len(bounds) != 2:
+            raise ValueError(f"stays must map cities being visited to [min, max] nights, got {city!r}: {bounds!r}")
+        stay_nights[_iata(city)] = (int(bounds[0]), int(bounds[1]))
+    for city, (low, high) in stay_nights.items():
+        if low < 1 or high < low:
+            raise ValueError(f"Stay for {city} must be at least 1 night with min <= max, got [{low}, {high}]")
+
+    optimizer = route_optimizer.RouteOptimizer(
+        origin, cities, _date_range(departure_window), stay_nights,
+        return_to_origin=return_to_origin, latest_return=_canonical_date(latest_return),
+    )
+    brute_force_legs, brute_force_itineraries = optimizer.brute_force()
+    failures: List[Dict[str, Any]] = []
+    timed_out = False
+
+    async def price_leg(leg):
+        nonlocal timed_out
+        from_id, to_id, day = leg
+        if timed_out:
+            # out of time: don't start new searches, let the solver finish with what is priced
+            failures.append({"from": from_id, "to": to_id, "date": day, "error": "not priced before the deadline", "timed_out": True})
+            return None
+        try:
+            data = await deadlines.within(deadlines.share(), search_flights(from_id, to_id, day, None, travel_class, adults))
+        except deadlines.DeadlineExceeded as e:
+            timed_out = True
+            failures.append({"from": from_id, "to": to_id, "date": day, "error": str(e), "timed_out": True})
+            return None
+        except (httpx.HTTPError, SerpApiError) as e:
+            failures.append({"from": from_id, "to": to_id, "date": day, "error": str(e)})
+            return None
+        itinerary = _cheapest_itinerary(data)
+        return (itinerary["price"], itinerary) if itinerary else None
+
+    started = time.perf_counter()
+    result = await optimizer.solve(price_leg, max_legs, concurrency=GRID_CONCURRENCY, wave=OPTIMIZE_WAVE)
+    legs = [
+        {"from": from_id, "to": to_id, "date": day, "price": optimizer.prices[(from_id, to_id, day)][0],
+         "itinerary": optimizer.prices[(from_id, to_id, day)][1]}
+        for from_id, to_id, day in result["legs"] or ()
+    ]
+    unpriced = sum(1 for failure in failures if failure.get("timed_out"))
+    legs_priced = len(optimizer.prices) - unpriced
+    return {
+        "origin": origin,
+        # a leg left unpriced by the deadline may hide a cheaper trip
+        "complete": result["complete"] and not timed_out,
+        "timed_out": timed_out,
+        "found": result["cost"] is not None,
+        "total_price": result["cost"],
+        "order": [leg["to"] for leg in legs if leg["to"] != origin],
+        "legs": legs,
+        "search": {
+            "legs_priced": legs_priced,
+            "unavailable_legs": sum(1 for v in optimizer.prices.values() if v is None) - unpriced,
+            "unpriced_legs": unpriced,
+            "states_expanded": optimizer.expanded,
+            "brute_force_legs": brute_force_legs,
+            "brute_force_itineraries": brute_force_itineraries,
+            "upstream_calls_saved": brute_force_legs - legs_priced,
+            "max_legs": max_legs,
+        },
+        "errors": failures,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+# Metro / region aliases that don't appear as a single city in the airport data.
+METRO_AREAS = {
+    "NYC": ["JFK", "LGA", "EWR"],
+    "NEW YORK": ["JFK", "LGA", "EWR"],
+    "BAY AREA": ["SFO", "OAK", "SJC"],
+    "SF BAY AREA": ["SFO", "OAK", "SJC"],
+    "WASHINGTON": ["IAD", "DCA", "BWI"],
+    "DC": ["IAD", "DCA", "BWI"],
+    "WAS": ["IAD", "DCA", "BWI"],
+    "CHICAGO": ["ORD", "MDW"],
+    "CHI": ["ORD", "MDW"],
+    "LOS ANGELES": ["LAX", "BUR", "LGB", "SNA", "ONT"],
+    "SOUTH FLORIDA": ["MIA", "FLL", "PBI"],
+    "DALLAS": ["DFW", "DAL"],
+    "HOUSTON": ["IAH", "HOU"],
+}
+MULTI_MAX_PAIRS = http_pool._env_int("MULTI_MAX_PAIRS", 16)
+
+
+def expand_airports(places: List[str]) -> List[str]:
+    """
+    Expand airport codes, city names and metro names into IATA codes.
+    "NYC" -> JFK, LGA, EWR; "Boston" -> BOS; "Heathrow" -> LHR; "SFO" -> SFO.
+    Order is preserved and duplicates dropped. Raises ValueError for a name
+    that matches nothing.
+    """
+    from airport_db import normalize
+
+    airports = airport_index()
+    codes: List[str] = []
+    for place in places:
+        key = place.strip().upper()
+        metro = airports.metro(key) if len(key) == 3 else None
+        if key in METRO_AREAS:
+            matches = METRO_AREAS[key]
+        elif len(key) == 3 and key.isalpha() and (airports.get(key) or not metro):
+            matches = [key]
+        elif metro:
+            matches = metro["airports"]
+        else:
+            found = [m for m in airports.search(place, 10) if m["score"] >= 70]
+            city = normalize(place.strip())
+            in_city = [m for m in found if normalize(m["city"]) == city]
+            if in_city:
+                # a city: its metro-area airports, or the best few if it has no metro code
+                major = [m for m in in_city if m["metro"]]
+                matches = [m["id"] for m in (major or in_city[:3])]
+            else:
+                matches = [m["id"] for m in found[:1]]
+        if not matches:
+            raise ValueError(f"Unknown airport, city or metro area: {place}")
+        codes.extend(c for c in matches if c not in codes)
+    return codes
+
+
+@mcp.tool()
+def resolve_airport(query: str, limit: int = 10):
+    """
+    Look up airports worldwide by IATA code, metro code (NYC, LON, TYO),
+    city or airport name, tolerating misspellings ("Narita", "heathrw").
+    Returns ranked matches with code, name, city, country and coordinates.
+    """
+    started = time.perf_counter()
+    matches = airport_index().search(query, max(1, min(limit, 50)))
+    return {
+        "query": query,
+        "matches": matches,
+        "lookup_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def _itinerary_key(itinerary: Dict[str, Any]) -> tuple:
+    """Identity of an itinerary: its flight numbers and departure times."""
+    return tuple(
+        (seg.get("flight_number"), seg.get("departure_airport", {}).get("time"))
+        for seg in itinerary.get("flights", [])
+    )
+
+
+@mcp.tool()
+async def search_flights_multi(
+    origins: List[str],
+    destinations: List[str],
+    outbound_date: str,
+    return_date: Optional[str] = None,
+    travel_class: str = "economy",
+    adults: int = 1,
+    max_results: int = 50,
+    max_concurrency: int = GRID_CONCURRENCY
+):
+    """
+    Search every origin x destination airport pair at once.
+    origins / destinations accept IATA codes, city names or metro names
+    (e.g. ["NYC"], ["Bay Area"], ["JFK", "Newark"]). Results from all pairs are
+    merged, de-duplicated by flight numbers and departure times, and ranked by
+    price then duration. Per-pair latency and errors are reported in "pairs".
+    """
+    origin_codes = expand_airports(origins)
+    destination_codes = expand_airports(destinations)
+    pairs = [(o, d) for o in origin_codes for d in destination_codes if o != d]
+    if not pairs:
+        raise ValueError("No origin/destination pairs to search")
+    if len(pairs) > MULTI_MAX_PAIRS:
+        raise ValueError(f"{len(pairs)} airport pairs requested; the limit is {MULTI_MAX_PAIRS}")
+
+    concurrency = max(1, min(max_concurrency, GRID_CONCURRENCY * 4))
+    semaphore = asyncio.Semaphore(concurrency)
+    budget = deadlines.fanout()
+
+    async def search_pair(origin: str, destination: str):
+        report = {"departure_id": origin, "arrival_id": destination}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                data = await deadlines.within(budget(), search_flights(
+                    origin, destination, outbound_date, return_date, travel_class, adults
+                ))
+            except deadlines.DeadlineExceeded as e:
+                data = None
+                report["error"] = str(e)
+                report["timed_out"] = True
+            except (httpx.HTTPError, SerpApiError) as e:
+                data = None
+                report["error"] = str(e)
+            report["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return report, data
+
+    results = await asyncio.gather(*(search_pair(o, d) for o, d in pairs))
+
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for report, data in results:
+        if data is None:
+            continue
+        options = data.get("best_flights", []) + data.get("other_flights", [])
+        report["results"] = len(options)
+        for itinerary in options:
+            key = _itinerary_key(itinerary)
+            price = itinerary.get("price")
+            current = merged.get(key)
+            if current is None or (price is not None and (current.get("price") is None or price < current["price"])):
+                # copy so cached responses are never mutated
+                merged[key] = {**itinerary, "departure_id": report["departure_id"], "arrival_id": report["arrival_id"]}
+
+    ranked = sorted(
+        merged.values(),
+        key=lambda f: (f.get("price") is None, f.get("price") or 0, f.get("total_duration") or 0),
+    )
+    return {
+        "origins": origin_codes,
+        "destinations": destination_codes,
+        "pairs": [report for report, _ in results],
+        "total_unique": len(ranked),
+        "flights": ranked[:max_results],
+    }
+
+
+def _safe_err(e: httpx.HTTPStatusError):
     try:
         return e.response.json()
     except Exception:
@@ -211,21 +965,71 @@ def duffel_headers():
         "Accept": "application/json",
         "Content-Type": "application/json",
         "Duffel-Version": DUFFEL_VERSION,
-        "Authorization": f"Bearer {DUFFEL_TOKEN}"
+        "Authorization": f"Bearer {_duffel_token()}"
     }
 
-def duffel_get(path: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-    r = requests.get(f"{DUFFEL_BASE}{path}", headers=duffel_headers(), params=params, timeout=30)
+def _duffel_quota_error(method: str, path: str, client: httpx.AsyncClient, e: upstream_scheduler.QuotaExceeded) -> httpx.HTTPStatusError:
+    """
+    DUFFEL_REQUEST_LIMIT reached: report it as a 429 from Duffel, which every
+    Duffel tool already turns into an error result (instead of an unhandled exception).
+    """
+    request = httpx.Request(method, client.base_url.join(path.lstrip("/")))
+    response = httpx.Response(
+        429, request=request, json={"errors": [{"code": "request_budget_exhausted", "title": str(e)}]}
+    )
+    return httpx.HTTPStatusError(str(e), request=request, response=response)
+
+async def _duffel_get(path: str, params: Dict[str, Any] = None, priority: int = PRIORITY_SEARCH) -> Dict[str, Any]:
+    headers = duffel_headers()
+    client = http_pool.get_client("duffel")
+    try:
+        r = await scheduler.request(
+            "duffel", priority, lambda: metrics.upstream(client.get(path, headers=headers, params=params, timeout=30))
+        )
+    except upstream_scheduler.QuotaExceeded as e:
+        raise _duffel_quota_error("GET", path, client, e)
     r.raise_for_status()
-    return r.json()
+    return metrics.decode(r)
+
+async def duffel_get(path: str, params: Dict[str, Any] = None, priority: int = PRIORITY_SEARCH) -> Dict[str, Any]:
+    """GET from Duffel; concurrent identical GETs share one upstream request."""
+    key = response_cache.make_key(f"duffel:GET {path}", params or {})
+    return await _coalesce(key, lambda: _duffel_get(path, params, priority))
 
-def duffel_post(path: str, data: Dict[str, Any]) -> Dict[str, Any]:
-    r = requests.post(f"{DUFFEL_BASE}{path}", headers=duffel_headers(), data=json.dumps({"data": data}), timeout=45)
+async def _duffel_post(path: str, data: Dict[str, Any], priority: int, idempotent: bool) -> Dict[str, Any]:
+    headers = duffel_headers()
+    client = http_pool.get_client("duffel")
+    body = fastjson.dumps({"data": data})
+    try:
+        r = await scheduler.request(
+            "duffel",
+            priority,
+            lambda: metrics.upstream(client.post(path, headers=headers, content=body, timeout=45)),
+            retry_errors=idempotent,
+        )
+    except upstream_scheduler.QuotaExceeded as e:
+        raise _duffel_quota_error("POST", path, client, e)
     r.raise_for_status()
-    return r.json()
+    return metrics.decode(r)
+
+async def duffel_post(
+    path: str,
+    data: Dict[str, Any],
+    coalesce: bool = False,
+    priority: int = PRIORITY_SEARCH
+) -> Dict[str, Any]:
+    """
+    POST to Duffel. Only pass coalesce=True for search-like requests that are
+    safe to share (offer requests); orders and payments must never be coalesced,
+    and are only retried on 429 (never on 5xx or connection errors).
+    """
+    if not coalesce:
+        return await _duffel_post(path, data, priority, idempotent=False)
+    key = response_cache.make_key(f"duffel:POST {path}", data)
+    return await _coalesce(key, lambda: _duffel_post(path, data, priority, idempotent=True))
 
 @mcp.tool()
-def duffel_create_offer_request(
+async def duffel_create_offer_request(
     origin: str,
     destination: str,
     departure_date: str,
@@ -262,87 +1066,817 @@ def duffel_create_offer_request(
     try:
         # POST /air/offer_requests?return_offers=true|false
         path = f"/air/offer_requests?return_offers={'true' if return_offers else 'false'}"
-        resp = duffel_post(path, data)
+        resp = await duffel_post(path, data, coalesce=True)
         offer_request = resp.get("data", {})
-        offers = offer_request.get("offers", [])
+        request_offers = offer_request.get("offers", [])
+        if offer_request.get("id"):
+            offer_index().add(offer_request["id"], request_offers)
         return {
             "offer_request_id": offer_request.get("id"),
-            "offers": offers  # each item has an "id" field -> this is your offer_id
+            "offers": request_offers  # each item has an "id" field -> this is your offer_id
         }
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         return {"error": True, "message": str(e), "details": getattr(e.response, "text", None)}
 
-@mcp.tool()
-def duffel_list_offers(offer_request_id: str, sort: Optional[str] = None, limit: int = 50):
+DUFFEL_PAGE_LIMIT = 200  # largest page Duffel allows for /air/offers
+DUFFEL_MAX_OFFERS = http_pool._env_int("DUFFEL_MAX_OFFERS", 1000)
+OFFER_SORTS = {"cheapest": "total_amount", "fastest": "total_duration"}
+
+
+async def iter_offer_pages(
+    offer_request_id: str,
+    sort: Optional[str] = None,
+    limit: int = 50,
+    after: Optional[str] = None,
+    max_offers: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
     """
-    Retrieve offers for a given offer_request_id and return their IDs and key fields.
+    Walk /air/offers page by page using Duffel's `after` cursor.
+    Yields each raw page ({"data": [...], "meta": {...}}); stops when there is no next cursor
+    or max_offers have been read. The last page is requested with a smaller limit so it
+    holds no more than max_offers, and its cursor resumes right after it.
     """
-    params = {"offer_request_id": offer_request_id, "limit": str(limit)}
+    limit = max(1, min(limit, DUFFEL_PAGE_LIMIT))
+    params = {"offer_request_id": offer_request_id}
     if sort:
         params["sort"] = sort
+    read = 0
+    while True:
+        if after:
+            params["after"] = after
+        params["limit"] = str(limit if max_offers is None else max(1, min(limit, max_offers - read)))
+        page = await duffel_get("/air/offers", params=dict(params))
+        yield page
+        read += len(page.get("data") or [])
+        after = (page.get("meta") or {}).get("after")
+        if not after or not page.get("data") or (max_offers is not None and read >= max_offers):
+            return
+
+
+@mcp.tool()
+async def duffel_list_offers(
+    offer_request_id: str,
+    sort: Optional[str] = None,
+    limit: int = 50,
+    max_offers: Optional[int] = None,
+    top_k: Optional[int] = None,
+    after: Optional[str] = None,
+    ctx: Optional["Context"] = None
+):
+    """
+    Retrieve offers for a given offer_request_id and return their IDs and key fields.
+    Follows Duffel's pagination cursor until all offers or max_offers are read.
+    - sort: "total_amount" / "total_duration" (server side), or "cheapest" / "fastest"
+    - limit: page size (max 200)
+    - top_k: stop as soon as the k cheapest (or fastest, per sort) offers are known;
+      implies server-side sort, defaulting to total_amount
+    - after: cursor to resume from (the "after" of a previous truncated call, same sort)
+    Reports MCP progress per page when the client asked for it. When the walk stops
+    early (max_offers / top_k reached, or out of time under timeout_s), "after" holds
+    the cursor to resume from.
+    """
+    sort = OFFER_SORTS.get(sort, sort)
+    if top_k is not None and not sort:
+        sort = "total_amount"
+    budget = min(max_offers or DUFFEL_MAX_OFFERS, DUFFEL_MAX_OFFERS)
+    if top_k is not None:
+        # With a server-side sort the first k offers are already the best k.
+        budget = min(budget, top_k)
+
+    listed: List[Dict[str, Any]] = []
+    pages = 0
+
+    async def walk():
+        nonlocal pages, after
+        async for page in iter_offer_pages(offer_request_id, sort, min(limit, budget), after, budget):
+            pages += 1
+            data = page.get("data", [])
+            offer_index().add(offer_request_id, data)
+            # the last page is requested with limit=room, so nothing past the cursor is skipped
+            listed.extend(data[:budget - len(listed)])
+            after = (page.get("meta") or {}).get("after")
+            if ctx is not None:
+                await ctx.report_progress(len(listed), budget, f"page {pages}: {len(listed)} offers")
+
     try:
-        res = duffel_get("/air/offers", params=params)
-        offers = res.get("data", [])
-        return {"offers": offers}
-    except requests.HTTPError as e:
+        # under a deadline, stop paging in time to return the pages already read
+        await deadlines.within(deadlines.share(), walk())
+        timed_out = False
+    except deadlines.DeadlineExceeded:
+        timed_out = True
+    except httpx.HTTPStatusError as e:
         return {"error": True, "message": str(e), "details": getattr(e.response, "text", None)}
+    stopped_early = timed_out or (len(listed) >= budget and bool(after))
+    result = {
+        "offers": listed,
+        "pages": pages,
+        "sort": sort,
+        "truncated": stopped_early,
+        # pass back as after= to continue where this call stopped
+        "after": after if stopped_early else None,
+    }
+    if timed_out:
+        result["timed_out"] = True
+    return result
+
+
+@mcp.tool()
+def query_offers(
+    offer_request_id: str,
+    max_price: Optional[float] = None,
+    min_price: Optional[float] = None,
+    carriers: Optional[List[str]] = None,
+    max_stops: Optional[int] = None,
+    max_duration_minutes: Optional[int] = None,
+    sort_by: str = "price",
+    limit: int = 20,
+    offset: int = 0
+):
+    """
+    Filter, sort and page offers already fetched for an offer request, without
+    calling Duffel again. Offers are stored by duffel_create_offer_request and
+    duffel_list_offers; expired offers are skipped.
+    - carriers: marketing carrier IATA codes, e.g. ["UA", "AA"]
+    - max_stops: 0 for nonstop only
+    - sort_by: "price" or "duration"
+    """
+    if sort_by not in ("price", "duration"):
+        raise ValueError('sort_by must be "price" or "duration"')
+    offer_set = offer_index().get(offer_request_id)
+    if offer_set is None:
+        return {
+            "error": True,
+            "message": f"No stored offers for {offer_request_id}; call duffel_create_offer_request or duffel_list_offers first"
+        }
+    started = time.perf_counter()
+    matches = offer_set.query(
+        time.time(),
+        min_price=min_price,
+        max_price=max_price,
+        carriers=carriers,
+        max_stops=max_stops,
+        max_duration=max_duration_minutes,
+        sort_by=sort_by,
+    )
+    page = matches[offset:offset + limit]
+    return {
+        "offer_request_id": offer_request_id,
+        "total_matches": len(matches),
+        "stored_offers": len(offer_set),
+        "offers": [record.to_dict() for record in page],
+        "query_us": round((time.perf_counter() - started) * 1e6, 1),
+    }
+
+
+UNIFIED_BUDGET_S = http_pool._env_float("UNIFIED_BUDGET_S", 8.0)
+
+
+def _segment_key(carrier: Optional[str], number: Optional[str], departs: Optional[str]) -> tuple:
+    """(carrier, flight number, departure minute), comparable across Google and Duffel."""
+    return (
+        (carrier or "").upper(),
+        (number or "").lstrip("0"),
+        (departs or "")[:16].replace(" ", "T"),
+    )
+
+
+def _google_key(itinerary: Dict[str, Any]) -> tuple:
+    key = []
+    for seg in itinerary.get("flights", []):
+        carrier, _, number = (seg.get("flight_number") or "").partition(" ")
+        key.append(_segment_key(carrier, number, seg.get("departure_airport", {}).get("time")))
+    return tuple(key)
+
+
+def _duffel_key(offer: Dict[str, Any]) -> tuple:
+    """Key of the offer's first slice; Google results only cover the outbound leg."""
+    slices = offer.get("slices") or [{}]
+    return tuple(
+        _segment_key(
+            (seg.get("marketing_carrier") or {}).get("iata_code"),
+            seg.get("marketing_carrier_flight_number"),
+            seg.get("departing_at"),
+        )
+        for seg in slices[0].get("segments", [])
+    )
+
+
+def _duffel_summary(offer: Dict[str, Any]) -> Dict[str, Any]:
+    from offer_store import OfferRecord
+    record = OfferRecord(offer)
+    outbound = record.slices[0] if record.slices else (None, None, None, None, ())
+    return {
+        "sources": ["duffel"],
+        "offer_id": record.id,
+        "price": record.total_amount,
+        "currency": record.currency,
+        "total_duration": record.duration,
+        "stops": record.stops,
+        "carriers": list(record.carriers),
+        "flight_numbers": list(outbound[4]),
+        "departs": outbound[2],
+        "arrives": outbound[3],
+        "offer_expires_at": offer.get("expires_at"),
+    }
+
+
+@mcp.tool()
+async def search_unified(
+    departure_id: str,
+    arrival_id: str,
+    outbound_date: str,
+    return_date: Optional[str] = None,
+    travel_class: str = "economy",
+    adults: int = 1,
+    budget_s: float = UNIFIED_BUDGET_S,
+    max_results: int = 50
+):
+    """
+    Search Google Flights (SerpAPI) and Duffel at the same time and merge the results.
+    Returns whatever has arrived within budget_s seconds; a provider that is still
+    pending is cancelled and reported as "timeout". Itineraries are matched by
+    carrier, flight number and departure time: a Google result that Duffel also
+    sells carries the bookable Duffel offer_id (cheapest match), Duffel-only
+    offers are listed with sources=["duffel"]. Ranked by price.
+    """
+    departure_id, arrival_id = _iata(departure_id), _iata(arrival_id)
+    outbound_date, return_date = _canonical_date(outbound_date), _canonical_date(return_date)
+    budget_s = max(0.1, min(budget_s, 120.0))
+    if deadlines.remaining() is not None:
+        budget_s = min(budget_s, deadlines.share())
+
+    started = time.perf_counter()
+    providers: Dict[str, Dict[str, Any]] = {}
+
+    async def timed(name: str, call):
+        try:
+            return await call
+        finally:
+            providers.setdefault(name, {})["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    tasks = {
+        "google": asyncio.ensure_future(timed("google", search_flights(
+            departure_id, arrival_id, outbound_date, return_date, travel_class, adults
+        ))),
+        "duffel": asyncio.ensure_future(timed("duffel", duffel_create_offer_request(
+            departure_id, arrival_id, outbound_date, return_date, travel_class, adults
+        ))),
+    }
+    try:
+        await asyncio.wait(tasks.values(), timeout=budget_s)
+    finally:
+        pending = [t for t in tasks.values() if not t.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results: Dict[str, Any] = {}
+    for name, task in tasks.items():
+        report = providers.setdefault(name, {})
+        if task.cancelled():
+            report["status"] = "timeout"
+            continue
+        error = task.exception()
+        if error is None and isinstance(task.result(), dict) and task.result().get("error"):
+            error = task.result().get("message")
+        if error is not None:
+            if not isinstance(error, (str, httpx.HTTPError, SerpApiError, ValueError)):
+                raise error
+            report.update(status="error", error=str(error))
+            continue
+        report["status"] = "ok"
+        results[name] = task.result()
+
+    google = results.get("google") or {}
+    google_flights = google.get("best_flights", []) + google.get("other_flights", [])
+    duffel_offers = (results.get("duffel") or {}).get("offers", [])
+    if "google" in results:
+        providers["google"]["results"] = len(google_flights)
+    if "duffel" in results:
+        providers["duffel"]["results"] = len(duffel_offers)
+        providers["duffel"]["offer_request_id"] = results["duffel"].get("offer_request_id")
+
+    cheapest_offer: Dict[tuple, Dict[str, Any]] = {}
+    for offer in duffel_offers:
+        key = _duffel_key(offer)
+        current = cheapest_offer.get(key)
+        if current is None or float(offer.get("total_amount") or 0) < float(current.get("total_amount") or 0):
+            cheapest_offer[key] = offer
+
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for itinerary in google_flights:
+        key = _google_key(itinerary)
+        if key in merged and (merged[key].get("price") or 0) <= (itinerary.get("price") or 0):
+            continue
+        entry: Dict[str, Any] = {"sources": ["google"], **projections.compact_itinerary(itinerary)}
+        offer = cheapest_offer.get(key)
+        if offer is not None:
+            entry["sources"].append("duffel")
+            entry["offer_id"] = offer["id"]
+            entry["duffel_price"] = float(offer.get("total_amount") or 0)
+            entry["duffel_currency"] = offer.get("total_currency")
+            entry["offer_expires_at"] = offer.get("expires_at")
+        merged[key] = entry
+    for key, offer in cheapest_offer.items():
+        if key not in merged:
+            merged[key] = _duffel_summary(offer)
+
+    ranked = sorted(
+        merged.values(),
+        key=lambda f: (f.get("price") is None, f.get("price") or 0, f.get("total_duration") or 0),
+    )
+    return {
+        "departure_id": departure_id,
+        "arrival_id": arrival_id,
+        "outbound_date": outbound_date,
+        "return_date": return_date,
+        "providers": providers,
+        "partial": any(p.get("status") != "ok" for p in providers.values()),
+        "bookable": sum(1 for f in ranked if "offer_id" in f),
+        "total_unique": len(ranked),
+        "flights": ranked[:max_results],
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+# ---------- Batch search ----------
+
+BATCH_MAX_ITEMS = http_pool._env_int("BATCH_MAX_ITEMS", 50)
+BATCH_CONCURRENCY = http_pool._env_int("BATCH_CONCURRENCY", 8)
+# batch request "type" -> the search it runs; the other keys of the request are its arguments
+BATCH_SEARCHES = {
+    "one_way": search_flights,
+    "round_trip": search_flights,
+    "multi_city": search_multi_city,
+    "duffel_offers": duffel_create_offer_request,
+}
+
+
+def _batch_call(request: Dict[str, Any]):
+    """(search, bound arguments) for one batch request; ValueError if it can't run."""
+    if not isinstance(request, dict):
+        raise ValueError("each request must be an object with a \"type\"")
+    kind = request.get("type")
+    search = BATCH_SEARCHES.get(kind)
+    if search is None:
+        raise ValueError(f"type must be one of {sorted(BATCH_SEARCHES)}, got {kind!r}")
+    arguments = {k: v for k, v in request.items() if k != "type"}
+    if kind == "one_way" and arguments.get("return_date"):
+        raise ValueError("one_way requests take no return_date; use type round_trip")
+    if kind == "round_trip" and not arguments.get("return_date"):
+        raise ValueError("round_trip requests need a return_date")
+    try:
+        bound = inspect.signature(search).bind(**arguments)
+    except TypeError as e:
+        raise ValueError(f"invalid arguments for {kind}: {e}") from None
+    return search, bound
+
+
+@mcp.tool()
+async def batch_search(
+    requests: List[Dict[str, Any]],
+    max_concurrency: int = BATCH_CONCURRENCY,
+    stream: bool = False,
+    ctx: Optional["Context"] = None
+):
+    """
+    Run several searches in one call. Each request is {"type": ..., <arguments>}:
+    - "one_way" / "round_trip": search_flights arguments (round_trip needs return_date)
+    - "multi_city": search_multi_city arguments (legs, ...)
+    - "duffel_offers": duffel_create_offer_request arguments
+    Requests run concurrently (at most max_concurrency at a time) and share the
+    call's deadline (timeout_s). Results come back in input order as
+    {"index", "type", "result"} or {"index", "type", "error"}; one failing
+    request doesn't affect the others. stream=True sends each item as an MCP log
+    notification (logger "batch_search") as soon as it completes, and leaves
+    the results out of the final response, which then only reports status.
+    """
+    if not requests:
+        raise ValueError("requests must contain at least one search")
+    if len(requests) > BATCH_MAX_ITEMS:
+        raise ValueError(f"At most {BATCH_MAX_ITEMS} requests per batch, got {len(requests)}")
+
+    concurrency = max(1, min(max_concurrency, BATCH_CONCURRENCY * 4))
+    semaphore = asyncio.Semaphore(concurrency)
+    budget = deadlines.fanout()
+    started = time.perf_counter()
+    done = 0
+
+    async def run(index: int, request: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal done
+        item: Dict[str, Any] = {"index": index, "type": request.get("type") if isinstance(request, dict) else None}
+        try:
+            search, bound = _batch_call(request)
+        except ValueError as e:
+            item["error"] = str(e)
+        else:
+            async with semaphore:
+                item_started = time.perf_counter()
+                try:
+                    result = await deadlines.within(budget(), search(*bound.args, **bound.kwargs))
+                except deadlines.DeadlineExceeded as e:
+                    item.update(error=str(e), timed_out=True)
+                except (httpx.HTTPError, SerpApiError, ValueError) as e:
+                    item["error"] = str(e)
+                except Exception as e:
+                    # malformed arguments the search itself trips over (e.g. a leg without "from");
+                    # cancellation is a BaseException and still ends the whole batch
+                    item["error"] = f"{type(e).__name__}: {e}"
+                else:
+                    if isinstance(result, dict) and result.get("error") is True:
+                        item.update(error=result.get("message"), details=result.get("details"))
+                    else:
+                        item["result"] = result
+                item["latency_ms"] = round((time.perf_counter() - item_started) * 1000, 1)
+        done += 1
+        if ctx is not None:
+            if stream:
+                await ctx.log("info", fastjson.dumps(item).decode(), logger_name="batch_search")
+                item.pop("result", None)
+            await ctx.report_progress(done, len(requests), f"{done}/{len(requests)} searches done")
+        return item
+
+    items = await asyncio.gather(*(run(i, request) for i, request in enumerate(requests)))
+    metrics.record("batch_items", len(items))
+    return {
+        "items": items,
+        "succeeded": sum(1 for item in items if "error" not in item),
+        "failed": sum(1 for item in items if "error" in item),
+        "streamed": stream and ctx is not None,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }
+
+
+# ---------- Price watches ----------
+
+WATCH_MIN_INTERVAL_MIN = http_pool._env_float("WATCH_MIN_INTERVAL_MIN", 15.0)
+_price_watcher: Optional["price_watch.PriceWatcher"] = None
+
+
+def _watch_db_path() -> str:
+    return os.getenv("WATCH_DB_PATH", os.path.join(os.getcwd(), ".cache", "price_watch.sqlite3"))
+
+
+def price_watcher() -> "price_watch.PriceWatcher":
+    """Price-watch engine; imported and its SQLite store opened on first use."""
+    global _price_watcher
+    if _price_watcher is None:
+        import price_watch
+        _price_watcher = price_watch.PriceWatcher(
+            _watch_db_path(),
+            _poll_watch,
+            concurrency=http_pool._env_int("WATCH_CONCURRENCY", 4),
+            batch_size=http_pool._env_int("WATCH_BATCH_SIZE", 32),
+        )
+    return _price_watcher
+
+
+async def _poll_watch(query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One watch poll: a background-priority search_flights through the shared
+    cache. Only a fresh entry is used; a stale one could be as old as the poll
+    interval and would be recorded as the price now.
+    """
+    api_key = os.getenv("SERPAPI_API_KEY")
+    if not api_key:
+        raise ValueError("API key not found. Please set the SERPAPI_API_KEY environment variable.")
+    return await serpapi_get(
+        {**query, "api_key": api_key}, cache_tool="search_flights", priority=PRIORITY_BACKGROUND, allow_stale=False
+    )
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds") if ts is not None else None
+
+
+def _watch_summary(watch: "price_watch.Watch") -> Dict[str, Any]:
+    query = watch.query
+    summary = {
+        "watch_id": watch.id,
+        "departure_id": query["departure_id"],
+        "arrival_id": query["arrival_id"],
+        "outbound_date": query["outbound_date"],
+        "return_date": query.get("return_date"),
+        "travel_class": "economy" if query["travel_class"] == "1" else "business",
+        "adults": query["adults"],
+        "interval_minutes": round(watch.interval_s / 60, 2),
+        "target_price": watch.target_price,
+    }
+    group = price_watcher().group_of(watch)
+    if group is None:
+        # unwatched or expired while the caller was waiting
+        return {**summary, "removed": True}
+    current = group.last.get("cheapest_price")
+    return {
+        **summary,
+        "current_price": current,
+        "previous_price": group.previous_price,
+        "lowest_seen": group.lowest_seen,
+        "price_level": group.last.get("price_level"),
+        "price_dropped": current is not None and group.previous_price is not None and current < group.previous_price,
+        "target_reached": current is not None and watch.target_price is not None and current <= watch.target_price,
+        "last_polled_at": _iso(group.last_polled),
+        "shares_poll_with": len(group.watches) - 1,
+        "last_error": group.last_error,
+    }
+
+
+def _watch(watch_id: str) -> "price_watch.Watch":
+    watch = price_watcher().get(watch_id.strip())
+    if watch is None:
+        raise ValueError(f"Unknown watch_id: {watch_id}")
+    return watch
+
+
+@mcp.tool()
+async def watch_route(
+    departure_id: str,
+    arrival_id: str,
+    outbound_date: str,
+    return_date: Optional[str] = None,
+    travel_class: str = "economy",
+    adults: int = 1,
+    interval_minutes: float = 60,
+    target_price: Optional[float] = None,
+):
+    """
+    Watch the fare of a search_flights query. The server polls it in the
+    background every interval_minutes (at least WATCH_MIN_INTERVAL_MIN) until
+    the outbound date; identical queries share one poll. list_watches shows
+    the current price, drops and whether target_price was reached;
+    get_watch_history the recorded price changes.
+    """
+    if interval_minutes < WATCH_MIN_INTERVAL_MIN:
+        raise ValueError(f"interval_minutes must be at least {WATCH_MIN_INTERVAL_MIN:g}")
+    query = _flight_search_params(departure_id, arrival_id, outbound_date, return_date, travel_class, adults, None)
+    query = {k: v for k, v in query.items() if k != "api_key"}
+    try:
+        day = datetime.strptime(query["outbound_date"], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise ValueError(f"outbound_date must be a date (YYYY-MM-DD), got {outbound_date!r}")
+    expires_at = (day + timedelta(days=1)).timestamp()
+    if expires_at <= time.time():
+        raise ValueError("outbound_date is in the past")
+
+    watch, _ = await price_watcher().add(
+        response_cache.make_key("watch", query), query, interval_minutes * 60, target_price, expires_at
+    )
+    return _watch_summary(watch)
+
+
+@mcp.tool()
+async def list_watches(limit: int = 100, offset: int = 0):
+    """Active price watches with their latest price, previous price, lowest seen and alert flags."""
+    watcher = price_watcher()
+    await watcher.start()
+    watches = watcher.watches()
+    return {
+        "total": len(watches),
+        "offset": offset,
+        "watches": [
+            summary for summary in map(_watch_summary, watches[offset:offset + limit]) if not summary.get("removed")
+        ],
+        "engine": watcher.stats(),
+    }
+
+
+@mcp.tool()
+async def get_watch_history(watch_id: str, limit: int = 100):
+    """Price snapshots recorded for a watch (one per change, oldest first; the last `limit`)."""
+    watcher = price_watcher()
+    await watcher.start()
+    watch = _watch(watch_id)
+    history = await watcher.history(watch, limit)
+    return {
+        "watch": _watch_summary(watch),
+        "snapshots": [{"polled_at": _iso(polled_at), **state} for polled_at, state in history],
+    }
+
+
+@mcp.tool()
+async def unwatch_route(watch_id: str):
+    """Stop a price watch and, if no other watch shares its query, drop its history."""
+    watcher = price_watcher()
+    await watcher.start()
+    watch = _watch(watch_id)
+    return {"watch_id": watch.id, "removed": await watcher.remove(watch.id)}
 
 
 # ---------- Duffel booking tools (MCP) ----------
 
+OFFER_CACHE_MAX_AGE_S = http_pool._env_float("OFFER_CACHE_MAX_AGE_S", 120.0)
+OFFER_REVALIDATE_WITHIN_S = http_pool._env_float("OFFER_REVALIDATE_WITHIN_S", 30.0)
+# Duffel error codes meaning an offer's price or availability moved since it was validated
+OFFER_CHANGED_CODES = {"price_changed", "offer_no_longer_available", "offer_expired", "offer_not_found"}
+# offer_id -> (GET /air/offers response, validated at, valid until); an entry lives
+# OFFER_CACHE_MAX_AGE_S at most, and never past the offer's expires_at
+validated_offers = response_cache.TTLCache(
+    max_entries=http_pool._env_int("OFFER_CACHE_MAX_ENTRIES", 1000),
+    max_bytes=http_pool._env_int("OFFER_CACHE_MAX_BYTES", 32 * 1024 * 1024),
+)
+# order_id -> offer_id of orders created here, so a failed payment can drop the offer's validation
+_order_offers: Dict[str, str] = {}
+_ORDER_OFFERS_MAX = 1000
+
+
+def _epoch(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+async def _validate_offer(offer_id: str) -> Tuple[Any, float, float]:
+    """GET the offer from Duffel and cache the validation until min(max age, expires_at)."""
+    res = await duffel_get(f"/air/offers/{offer_id}", priority=PRIORITY_BOOKING)
+    validated_at = time.time()
+    ttl = OFFER_CACHE_MAX_AGE_S
+    expires_at = _epoch((res.get("data") or {}).get("expires_at"))
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - validated_at)
+    entry = (res, validated_at, validated_at + ttl)
+    if ttl > 0:
+        validated_offers.set(offer_id, entry, ttl, size=fastjson.size(res))
+    return entry
+
+
+def _offer_changed(e: httpx.HTTPStatusError) -> bool:
+    """Whether a Duffel error says the offer's price or availability changed."""
+    details = _safe_err(e)
+    errors = details.get("errors") if isinstance(details, dict) else None
+    for error in errors or []:
+        if isinstance(error, dict) and (
+            error.get("code") in OFFER_CHANGED_CODES or "price" in str(error.get("title", "")).lower()
+        ):
+            return True
+    return False
+
+
 @mcp.tool()
-def booking_validate_or_price_offer(offer_id: str):
+async def booking_validate_or_price_offer(offer_id: str, refresh: bool = False):
     """
     Validate and fetch the latest pricing/availability for an offer.
     GET /air/offers/{offer_id}
+    A validation is reused for OFFER_CACHE_MAX_AGE_S seconds (never past the
+    offer's expires_at) and dropped when an order or payment reports a price
+    change; "cached" and "validated_at" say which one was returned.
+    refresh=True always asks Duffel.
     """
     try:
-        res = duffel_get(f"/air/offers/{offer_id}")
-        return {"offer": res.get("data")}
-    except requests.HTTPError as e:
+        entry = None if refresh else validated_offers.get(offer_id, count=True)
+        cached = entry is not None
+        if entry is None:
+            entry = await _validate_offer(offer_id)
+        metrics.record("cache_hits" if cached else "cache_misses")
+        res, validated_at, _ = entry
+        return {"offer": res.get("data"), "validated_at": _iso(validated_at), "cached": cached}
+    except httpx.HTTPStatusError as e:
+        validated_offers.invalidate(offer_id)
         return {"error": True, "message": str(e), "details": _safe_err(e)}
 
 
 
+SEATMAP_SECTIONS = {
+    "seat_maps": "/air/seat_maps",
+    "services": "/air/offer_services",
+}
+SEAT_OPTIONS_LIMIT = 10
+# seat designator -> service ID per passenger for offers whose seat maps were fetched
+seat_services = seat_maps.SeatServiceIndex(max_offers=http_pool._env_int("SEAT_INDEX_MAX_OFFERS", 1000))
+
+
 @mcp.tool()
-def booking_list_services_and_seatmaps(offer_id: str):
+async def booking_list_services_and_seatmaps(
+    offer_id: str,
+    include: str = "both",
+    view: str = "full",
+    seats_together: int = 1,
+    seat_position: Optional[str] = None,
+    max_seat_price: Optional[float] = None
+):
     """
     List ancillaries/services (bags, paid seats, etc.) and seat maps for an offer.
     - Seat maps: GET /air/seat_maps?offer_id=...
     - Services:  GET /air/offer_services?offer_id=...
+    Both are fetched concurrently. include="seats" or "services" fetches only one.
+    If one call fails the other's data is still returned; the failure is reported
+    under "errors" keyed by section.
+    view="compact" returns each cabin as a row x column grid (one string per row:
+    a price tier index into the seat map's "prices" for an available seat, "x"
+    taken, "." no seat, " " aisle) instead of Duffel's nested elements.
+    seats_together, seat_position ("window"/"aisle"/"middle") and max_seat_price
+    (per seat) add "seat_options": the cheapest matching seats per segment.
+    Chosen seats can be passed to booking_create_order(seats=...) by designator.
     """
-    try:
-        seat_maps = duffel_get("/air/seat_maps", params={"offer_id": offer_id}).get("data", [])
-        services = duffel_get("/air/offer_services", params={"offer_id": offer_id}).get("data", [])
-        return {
-            "services": services,   # may include bags, chargeable seats, etc.
-            "seat_maps": seat_maps  # renderable data for seat selection
-        }
-    except requests.HTTPError as e:
-        return {"error": True, "message": str(e), "details": _safe_err(e)}
+    wanted = {"both": ["seat_maps", "services"], "seats": ["seat_maps"], "services": ["services"]}.get(include)
+    if wanted is None:
+        raise ValueError('include must be "both", "seats" or "services"')
+    if view not in seat_maps.VIEWS:
+        raise ValueError(f"view must be one of {seat_maps.VIEWS}, got {view!r}")
+    if seat_position is not None and seat_position not in seat_maps.POSITIONS:
+        raise ValueError(f"seat_position must be one of {seat_maps.POSITIONS}, got {seat_position!r}")
+    if seats_together < 1:
+        raise ValueError("seats_together must be at least 1")
+    filtered = seats_together > 1 or seat_position is not None or max_seat_price is not None
+
+    per_section = deadlines.share()
+    results = await asyncio.gather(
+        *(
+            deadlines.within(per_section, duffel_get(SEATMAP_SECTIONS[section], params={"offer_id": offer_id}, priority=PRIORITY_BOOKING))
+            for section in wanted
+        ),
+        return_exceptions=True
+    )
+
+    response: Dict[str, Any] = {}
+    errors: Dict[str, Any] = {}
+    for section, result in zip(wanted, results):
+        if isinstance(result, httpx.HTTPStatusError):
+            errors[section] = {"message": str(result), "details": _safe_err(result)}
+        elif isinstance(result, deadlines.DeadlineExceeded):
+            errors[section] = {"message": str(result), "timed_out": True}
+        elif isinstance(result, httpx.HTTPError):
+            errors[section] = {"message": str(result)}
+        elif isinstance(result, BaseException):
+            raise result
+        elif section == "seat_maps":
+            maps = [seat_maps.SeatMap(m) for m in result.get("data", [])]
+            seat_services.remember(offer_id, maps)
+            if filtered:
+                response["seat_options"] = [
+                    option for seat_map in maps
+                    for option in seat_maps.find_seats(seat_map, seats_together, seat_position, max_seat_price, SEAT_OPTIONS_LIMIT)
+                ]
+            response[section] = [seat_maps.compact(m) for m in maps] if view == "compact" else [m.raw for m in maps]
+        else:
+            # services may include bags, chargeable seats, etc.
+            response[section] = result.get("data", [])
+
+    if errors and not response:
+        first = next(iter(errors.values()))
+        return {"error": True, "message": first["message"], "details": first.get("details"), "errors": errors}
+    if errors:
+        response["errors"] = errors
+    return response
 
 
 @mcp.tool()
-def booking_create_order(
+async def booking_create_order(
     offer_id: str,
     passengers: List[Dict],
     payments: Optional[List[Dict]] = None,
     services: Optional[List[Dict]] = None,
     type: str = "instant",   # "instant" or "hold"
     metadata: Optional[Dict] = None,
-    contact: Optional[Dict] = None
+    contact: Optional[Dict] = None,
+    seats: Optional[List[Dict]] = None
 ):
     """
     Create a Duffel order.
     - Instant purchase: include payments=[{type: 'balance', amount, currency}]
     - Hold: set type='hold' and omit payments (only allowed when offer is hold-eligible)
       POST /air/orders
+    - seats=[{passenger_id, designator, segment_id}] books seats by designator (e.g. "12A");
+      they are resolved to Duffel seat service IDs and added to services. segment_id can be
+      left out when the designator is on one segment only. Payments must include their price.
+    If booking_validate_or_price_offer validated the offer and that validation has
+    OFFER_REVALIDATE_WITHIN_S or less left, the offer is validated again first; a price
+    that changed since the earlier validation is reported as an error instead of ordering.
     """
     try:
+        entry = validated_offers.get(offer_id, count=True)
+        if entry is not None and entry[2] - time.time() < OFFER_REVALIDATE_WITHIN_S:
+            previous = entry[0].get("data") or {}
+            metrics.record("offer_revalidations")
+            res, _, _ = await _validate_offer(offer_id)
+            current = res.get("data") or {}
+            price = (current.get("total_amount"), current.get("total_currency"))
+            if price != (previous.get("total_amount"), previous.get("total_currency")):
+                return {
+                    "error": True,
+                    "message": f"Offer price changed from {previous.get('total_amount')} {previous.get('total_currency')} "
+                               f"to {price[0]} {price[1]}; confirm the new price before ordering",
+                    "offer": current,
+                }
+        elif entry is not None:
+            metrics.record("cache_hits")
+
         payload = {
             "selected_offers": [offer_id],
             "passengers": passengers,
         }
+        chosen_seats = None
+        if seats:
+            if offer_id not in seat_services:
+                res = await duffel_get(SEATMAP_SECTIONS["seat_maps"], params={"offer_id": offer_id}, priority=PRIORITY_BOOKING)
+                seat_services.remember(offer_id, [seat_maps.SeatMap(m) for m in res.get("data", [])])
+            try:
+                chosen_seats = seat_services.resolve(offer_id, seats)
+            except ValueError as e:
+                return {"error": True, "message": str(e)}
+            services = list(services or []) + [{"id": seat["service_id"], "quantity": 1} for seat in chosen_seats]
         if services:
             payload["services"] = services
         if metadata:
@@ -357,15 +1891,23 @@ def booking_create_order(
                 return {"error": True, "message": "payments are required for instant purchase orders"}
             payload["payments"] = payments
 
-        res = duffel_post("air/orders", payload)
+        res = await duffel_post("air/orders", payload, priority=PRIORITY_BOOKING)
         order = res.get("data")
+        if order and order.get("id"):
+            _order_offers[order["id"]] = offer_id
+            while len(_order_offers) > _ORDER_OFFERS_MAX:
+                del _order_offers[next(iter(_order_offers))]
+        if chosen_seats:
+            return {"order": order, "seats": chosen_seats}
         return {"order": order}
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404 or _offer_changed(e):
+            validated_offers.invalidate(offer_id)
         return {"error": True, "message": str(e), "details": _safe_err(e)}
 
 
 @mcp.tool()
-def booking_pay_for_order(order_id: str, amount: str, currency: str, payment_type: str = "balance"):
+async def booking_pay_for_order(order_id: str, amount: str, currency: str, payment_type: str = "balance"):
     """
     Pay for a hold order using Duffel Payments.
     - POST /air/payments
@@ -380,35 +1922,175 @@ def booking_pay_for_order(order_id: str, amount: str, currency: str, payment_typ
                 "currency": currency
             }
         }
-        res = duffel_post("/air/payments", payload)
+        res = await duffel_post("/air/payments", payload, priority=PRIORITY_PAYMENT)
         return {"payment": res.get("data")}
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
+        if order_id in _order_offers and _offer_changed(e):
+            validated_offers.invalidate(_order_offers[order_id])
         return {"error": True, "message": str(e), "details": _safe_err(e)}
 
 
 @mcp.tool()
-def booking_get_order_status(order_id: str):
+async def booking_get_order_status(order_id: str):
     """
     Retrieve latest order state including payment_status and documents (tickets).
     - GET /air/orders/{order_id}
     """
     try:
-        res = duffel_get(f"/air/orders/{order_id}")
+        res = await duffel_get(f"/air/orders/{order_id}", priority=PRIORITY_BOOKING)
         order = res.get("data")
         return {
             "order": order,
             "payment_status": (order or {}).get("payment_status"),
             "documents": (order or {}).get("documents")
         }
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         return {"error": True, "message": str(e), "details": _safe_err(e)}
 
 
+ORDERS_MAX_IDS = http_pool._env_int("ORDERS_MAX_IDS", 500)
+ORDERS_CONCURRENCY = http_pool._env_int("ORDERS_CONCURRENCY", 16)
+ORDER_WATCH_FIRST_INTERVAL_S = http_pool._env_float("ORDER_WATCH_FIRST_INTERVAL_S", 2.0)
+ORDER_WATCH_MAX_INTERVAL_S = http_pool._env_float("ORDER_WATCH_MAX_INTERVAL_S", 60.0)
+ORDER_WATCH_MAX_WAIT_S = http_pool._env_float("ORDER_WATCH_MAX_WAIT_S", 900.0)
+# last seen state of each order polled by booking_get_orders_status
+order_state = order_snapshots.OrderSnapshots(max_orders=http_pool._env_int("ORDER_SNAPSHOT_MAX", 10000))
+
+
+async def _order_status(
+    order_id: str, semaphore: asyncio.Semaphore, budget: Callable[[], Optional[float]]
+) -> Dict[str, Any]:
+    """Fetch one order and diff it against its snapshot."""
+    entry: Dict[str, Any] = {"order_id": order_id}
+    async with semaphore:
+        try:
+            res = await deadlines.within(budget(), duffel_get(f"/air/orders/{order_id}"))
+        except deadlines.DeadlineExceeded as e:
+            return {**entry, "error": str(e), "timed_out": True, "settled": False}
+        except httpx.HTTPStatusError as e:
+            # other 4xx (unknown order, no access) won't change by polling again
+            final = e.response.status_code < 500 and e.response.status_code != 429
+            return {**entry, "error": str(e), "status_code": e.response.status_code, "settled": final}
+        except httpx.HTTPError as e:
+            return {**entry, "error": str(e), "settled": False}
+    summary = order_snapshots.summarize(res.get("data") or {})
+    first_seen, changed = order_state.update(order_id, summary)
+    return {
+        **entry,
+        "payment_status": summary["payment_status"],
+        "documents": summary["documents"],
+        "settled": order_snapshots.is_settled(summary),
+        "first_seen": first_seen,
+        "changed_fields": changed,
+        # payment_status and documents are always returned; other fields only when they changed
+        "changed": {
+            field: summary[field] for field in changed
+            if field not in ("payment_status", "documents", "slices_checksum")
+        },
+    }
+
+
+@mcp.tool()
+async def booking_get_orders_status(
+    order_ids: List[str],
+    watch: bool = False,
+    max_wait_s: float = 120,
+    ctx: Optional["Context"] = None
+):
+    """
+    payment_status and documents (tickets) of many orders in one call, fetched
+    concurrently under the Duffel rate limit. Each order also lists the fields
+    that changed since it was last polled here (changed_fields; values of
+    other fields in changed; a new slices_checksum means a schedule change).
+    watch=True keeps polling the orders that aren't settled (paid and ticketed,
+    or cancelled) at increasing intervals for up to max_wait_s seconds,
+    reporting MCP progress as orders settle.
+    """
+    ids = list(dict.fromkeys(order_id.strip() for order_id in order_ids if order_id and order_id.strip()))
+    if not ids:
+        raise ValueError("order_ids must contain at least one order ID")
+    if len(ids) > ORDERS_MAX_IDS:
+        raise ValueError(f"At most {ORDERS_MAX_IDS} orders per call, got {len(ids)}")
+    max_wait_s = min(max_wait_s, ORDER_WATCH_MAX_WAIT_S)
+
+    semaphore = asyncio.Semaphore(ORDERS_CONCURRENCY)
+    results: Dict[str, Dict[str, Any]] = {}
+    pending = ids
+    polls = 0
+    interval = ORDER_WATCH_FIRST_INTERVAL_S
+    started = time.monotonic()
+    while True:
+        polls += 1
+        budget = deadlines.fanout()
+        for entry in await asyncio.gather(*(_order_status(order_id, semaphore, budget) for order_id in pending)):
+            earlier = results.get(entry["order_id"])
+            if earlier is not None and "changed_fields" in earlier and "changed_fields" in entry:
+                # changes accumulate over the polls of one watch call
+                entry["first_seen"] = earlier["first_seen"]
+                entry["changed_fields"] = list(dict.fromkeys(earlier["changed_fields"] + entry["changed_fields"]))
+                entry["changed"] = {**earlier["changed"], **entry["changed"]}
+            results[entry["order_id"]] = entry
+        pending = [order_id for order_id in pending if not results[order_id]["settled"]]
+        if ctx is not None and watch:
+            await ctx.report_progress(len(ids) - len(pending), len(ids), f"poll {polls}: {len(pending)} unsettled")
+
+        if not watch or not pending:
+            break
+        left = max_wait_s - (time.monotonic() - started)
+        remaining = deadlines.remaining()
+        if remaining is not None:
+            left = min(left, remaining / 2)  # keep time for the poll after the wait
+        if interval > left:
+            break
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, ORDER_WATCH_MAX_INTERVAL_S)
+
+    orders = [results[order_id] for order_id in ids]
+    return {
+        "orders": orders,
+        "settled": sum(1 for o in orders if o["settled"] and "error" not in o),
+        "unsettled": pending,
+        "errors": sum(1 for o in orders if "error" in o),
+        "polls": polls,
+        "elapsed_s": round(time.monotonic() - started, 3),
+    }
+
+
+async def _serve():
+    """Run the streamable HTTP server and close the upstream pools on shutdown."""
+    if os.path.exists(_watch_db_path()):
+        await price_watcher().start()  # resume stored watches
+    try:
+        await mcp.run_streamable_http_async()
+    finally:
+        await http_pool.aclose_all()
+
 
 if __name__ == "__main__":
-    mcp.run(
-        transport="http",  
-        host="127.0.0.1",
-        port=8000,
-        log_level="info"
-    )
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Google Flights MCP server")
+    parser.add_argument(
+        "--cache-backend",
+        choices=["memory", "sqlite"],
+        default=os.getenv("CACHE_BACKEND", "memory"),
+        help="Where search/detail responses are cached (sqlite is shared across processes)",
+    )
+    parser.add_argument("--cache-path", default=None, help="SQLite cache file (default: .cache/flights_cache.sqlite3)")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument(
+        "--log-format",
+        choices=["json", "console"],
+        default=os.getenv("LOG_FORMAT", "json"),
+        help="Format of the per-call structured log lines (stderr)",
+    )
+    args = parser.parse_args()
+
+    import anyio
+
+    metrics.configure_logging(json_output=args.log_format == "json")
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    configure_cache(args.cache_backend, args.cache_path)
+    anyio.run(_serve)
\ No newline at end of file
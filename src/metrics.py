@@ -0,0 +1,320 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import fastjson
+from deadlines import DeadlineExceeded
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+PHASES = ("upstream", "decode", "serialize", "local")
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterable[Tuple[str, int]]:
+        total = 0
+        for bound, n in zip(self.bounds, self.counts):
+            total += n
+            yield _fmt(bound), total
+        yield "+Inf", self.count
+
+
+class ToolStats:
+    """Aggregated counters and histograms for one tool."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.timeouts = 0
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.phases = {phase: Histogram(LATENCY_BUCKETS) for phase in PHASES}
+        self.request_bytes = Histogram(BYTE_BUCKETS)
+        self.response_bytes = Histogram(BYTE_BUCKETS)
+        self.events: Dict[str, int] = {}
+
+
+class CallStats:
+    """
+    Timing for one tool call, shared (through a context variable) with every
+    task the call starts. Upstream time is the wall-clock time during which at
+    least one upstream request was outstanding, so concurrent fan-out requests
+    aren't double counted.
+    """
+
+    __slots__ = ("upstream", "decode", "tool", "events", "_active", "_busy_since")
+
+    def __init__(self):
+        self.upstream = 0.0
+        self.decode = 0.0
+        self.tool: Optional[float] = None
+        self.events: Dict[str, int] = {}
+        self._active = 0
+        self._busy_since = 0.0
+
+    def upstream_started(self):
+        if self._active == 0:
+            self._busy_since = time.perf_counter()
+        self._active += 1
+
+    def upstream_finished(self):
+        self._active -= 1
+        if self._active == 0:
+            self.upstream += time.perf_counter() - self._busy_since
+
+
+_current: ContextVar[Optional[CallStats]] = ContextVar("tool_call_stats", default=None)
+_tools: Dict[str, ToolStats] = {}
+_log = None
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def logger():
+    """Structured logger for the tools; structlog is imported on first use."""
+    # structlog is only needed once a call is logged; keep it off the import path
+    global _log
+    if _log is None:
+        import structlog
+        if not structlog.is_configured():
+            # served without __main__ (mcp run / mcp dev, or imported): structlog's
+            # default prints to stdout, which is the JSON-RPC stream on stdio
+            configure_logging(json_output=os.getenv("LOG_FORMAT", "json") != "console")
+        _log = structlog.get_logger("mcp.tools")
+    return _log
+
+
+def configure_logging(json_output: bool = True):
+    """One structured line per event on stderr (JSON, or key=value for a terminal)."""
+    import sys
+    import structlog
+
+    structlog.configure(
+        processors=[
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
+            structlog.processors.JSONRenderer() if json_output else structlog.dev.ConsoleRenderer(colors=False),
+        ],
+        logger_factory=structlog.PrintLoggerFactory(file=sys.stderr),
+        cache_logger_on_first_use=True,
+    )
+
+
+def record(event: str, n: int = 1):
+    """Count an event (cache hit, coalesced request, ...) against the current tool call."""
+    call = _current.get()
+    if call is not None:
+        call.events[event] = call.events.get(event, 0) + n
+
+
+async def upstream(request: Awaitable[Any]) -> Any:
+    """Await an upstream HTTP request, charging its time to the current tool call."""
+    call = _current.get()
+    if call is None:
+        return await request
+    call.events["upstream_requests"] = call.events.get("upstream_requests", 0) + 1
+    call.upstream_started()
+    try:
+        return await request
+    except asyncio.CancelledError:
+        # client cancelled the call or its deadline passed: the request is aborted
+        call.events["upstream_cancelled"] = call.events.get("upstream_cancelled", 0) + 1
+        raise
+    finally:
+        call.upstream_finished()
+
+
+def decode(response) -> "fastjson.Document":
+    """
+    The response body as a lazily parsed Document. Parsing happens when (and
+    if) a tool first reads from it, and is charged to that tool call.
+    """
+    return fastjson.Document(response.content)
+
+
+def _charge_decode(seconds: float):
+    call = _current.get()
+    if call is not None:
+        call.decode += seconds
+
+
+fastjson.observe_parse(_charge_decode)
+
+
+def instrument_tool(fn: Callable) -> Callable:
+    """Wrap a tool so the time spent in the tool body itself is recorded."""
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _mark_tool_time(started)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _mark_tool_time(started)
+    return wrapper
+
+
+def _mark_tool_time(started: float):
+    call = _current.get()
+    if call is not None:
+        call.tool = time.perf_counter() - started
+
+
+def _response_size(result: Any) -> Tuple[int, bool]:
+    """Bytes of the serialized tool result, and whether it reports an error."""
+    content = result[0] if isinstance(result, tuple) else result
+    text = "".join(getattr(block, "text", "") for block in content or ())
+    head = text[:200]
+    return len(text.encode()), '"error": true' in head or '"error":true' in head
+
+
+async def observe_call(name: str, arguments: Dict[str, Any], call: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run one MCP tool call (including FastMCP's result serialization) and record
+    its count, latency split by phase, request/response sizes and any events.
+    """
+    stats = _tools.get(name)
+    if stats is None:
+        stats = _tools[name] = ToolStats()
+    request_bytes = len(json.dumps(arguments, separators=(",", ":"), default=str).encode())
+    call_stats = CallStats()
+    token = _current.set(call_stats)
+    started = time.perf_counter()
+    status = "ok"
+    response_bytes = 0
+    try:
+        result = await call()
+        response_bytes, reported_error = _response_size(result)
+        if reported_error:
+            status = "error"
+        return result
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except Exception as e:
+        # FastMCP re-raises tool exceptions as ToolError, keeping the original as the cause
+        timed_out = isinstance(e, DeadlineExceeded) or isinstance(e.__cause__, DeadlineExceeded)
+        status = "timeout" if timed_out else "exception"
+        raise
+    finally:
+        _current.reset(token)
+        elapsed = time.perf_counter() - started
+        tool_time = call_stats.tool if call_stats.tool is not None else elapsed
+        phases = {
+            "upstream": call_stats.upstream,
+            "decode": call_stats.decode,
+            "serialize": max(0.0, elapsed - tool_time),
+            "local": max(0.0, tool_time - call_stats.upstream - call_stats.decode),
+        }
+        stats.calls += 1
+        if status == "cancelled":
+            stats.cancelled += 1
+        elif status == "timeout":
+            stats.timeouts += 1
+        elif status != "ok":
+            stats.errors += 1
+        stats.duration.observe(elapsed)
+        for phase, seconds in phases.items():
+            stats.phases[phase].observe(seconds)
+        stats.request_bytes.observe(request_bytes)
+        stats.response_bytes.observe(response_bytes)
+        for event, n in call_stats.events.items():
+            stats.events[event] = stats.events.get(event, 0) + n
+        logger().info(
+            "tool_call",
+            tool=name,
+            status=status,
+            duration_ms=round(elapsed * 1000, 2),
+            **{f"{phase}_ms": round(seconds * 1000, 2) for phase, seconds in phases.items()},
+            request_bytes=request_bytes,
+            response_bytes=response_bytes,
+            **call_stats.events,
+        )
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def render(gauges: Iterable[Tuple[str, str, Dict[str, Any], float]] = ()) -> str:
+    """
+    Prometheus text exposition of the per-tool metrics, followed by
+    (name, help, labels, value) gauges supplied by the caller.
+    """
+    lines: List[str] = []
+
+    def histogram(metric: str, help_text: str, series: Iterable[Tuple[Dict[str, Any], Histogram]]):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, hist in series:
+            for le, count in hist.cumulative():
+                lines.append(f"{metric}_bucket{_labels(**labels, le=le)} {count}")
+            lines.append(f"{metric}_sum{_labels(**labels)} {hist.sum:.6f}")
+            lines.append(f"{metric}_count{_labels(**labels)} {hist.count}")
+
+    tools = sorted(_tools.items())
+    lines.append("# HELP mcp_tool_calls_total Tool calls received over MCP.")
+    lines.append("# TYPE mcp_tool_calls_total counter")
+    lines.extend(f"mcp_tool_calls_total{_labels(tool=name)} {s.calls}" for name, s in tools)
+    lines.append("# HELP mcp_tool_errors_total Tool calls that raised or returned an error (excluding timeouts).")
+    lines.append("# TYPE mcp_tool_errors_total counter")
+    lines.extend(f"mcp_tool_errors_total{_labels(tool=name)} {s.errors}" for name, s in tools)
+    lines.append("# HELP mcp_tool_timeouts_total Tool calls that ran past their deadline.")
+    lines.append("# TYPE mcp_tool_timeouts_total counter")
+    lines.extend(f"mcp_tool_timeouts_total{_labels(tool=name)} {s.timeouts}" for name, s in tools)
+    lines.append("# HELP mcp_tool_cancelled_total Tool calls cancelled by the client.")
+    lines.append("# TYPE mcp_tool_cancelled_total counter")
+    lines.extend(f"mcp_tool_cancelled_total{_labels(tool=name)} {s.cancelled}" for name, s in tools)
+    histogram("mcp_tool_duration_seconds", "End-to-end tool call latency, including serialization.",
+              (({"tool": name}, s.duration) for name, s in tools))
+    histogram("mcp_tool_phase_seconds", "Tool call time split into upstream, decode, serialize and local.",
+              (({"tool": name, "phase": phase}, s.phases[phase]) for name, s in tools for phase in PHASES))
+    histogram("mcp_tool_request_bytes", "Size of the JSON tool arguments.",
+              (({"tool": name}, s.request_bytes) for name, s in tools))
+    histogram("mcp_tool_response_bytes", "Size of the serialized tool result.",
+              (({"tool": name}, s.response_bytes) for name, s in tools))
+    lines.append("# HELP mcp_tool_events_total Cache hits/misses, coalesced and upstream requests per tool.")
+    lines.append("# TYPE mcp_tool_events_total counter")
+    for name, s in tools:
+        for event, n in sorted(s.events.items()):
+            lines.append(f"mcp_tool_events_total{_labels(tool=name, event=event)} {n}")
+
+    seen = set()
+    for metric, help_text, labels, value in gauges:
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric}{_labels(**labels) if labels else ''} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
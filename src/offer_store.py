@@ -0,0 +1,232 @@
+import bisect
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+_DURATION_RE = re.compile(r"P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?")
+
+
+def parse_duration(value: Optional[str]) -> Optional[int]:
+    """ISO-8601 duration as used by Duffel ("PT5H30M", "P1DT2H") -> minutes."""
+    if not value:
+        return None
+    match = _DURATION_RE.fullmatch(value)
+    if not match:
+        return None
+    days, hours, minutes = (int(g or 0) for g in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class OfferRecord:
+    """Compact, query-friendly summary of one Duffel offer."""
+
+    __slots__ = (
+        "id", "total_amount", "currency", "duration", "stops", "carriers",
+        "owner", "expires_at", "slices",
+    )
+
+    def __init__(self, offer: Dict[str, Any]):
+        self.id: str = offer["id"]
+        self.total_amount = float(offer.get("total_amount") or 0)
+        self.currency: Optional[str] = offer.get("total_currency")
+        self.owner: Optional[str] = (offer.get("owner") or {}).get("iata_code")
+        self.expires_at = parse_timestamp(offer.get("expires_at"))
+
+        duration = 0
+        stops = 0
+        carriers: Set[str] = set()
+        slices = []
+        for sl in offer.get("slices", []):
+            segments = sl.get("segments", [])
+            duration += parse_duration(sl.get("duration")) or 0
+            stops = max(stops, len(segments) - 1)
+            flight_numbers = []
+            for seg in segments:
+                carrier = (seg.get("marketing_carrier") or {}).get("iata_code")
+                if carrier:
+                    carriers.add(carrier)
+                flight_numbers.append(f"{carrier or ''}{seg.get('marketing_carrier_flight_number') or ''}")
+            slices.append((
+                (sl.get("origin") or {}).get("iata_code"),
+                (sl.get("destination") or {}).get("iata_code"),
+                segments[0].get("departing_at") if segments else None,
+                segments[-1].get("arriving_at") if segments else None,
+                tuple(flight_numbers),
+            ))
+        self.duration = duration
+        self.stops = stops
+        self.carriers = tuple(sorted(carriers or ({self.owner} if self.owner else set())))
+        self.slices = tuple(slices)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offer_id": self.id,
+            "total_amount": self.total_amount,
+            "currency": self.currency,
+            "duration_minutes": self.duration,
+            "stops": self.stops,
+            "carriers": list(self.carriers),
+            "owner": self.owner,
+            "expires_at": self.expires_at,
+            "slices": [
+                {"origin": o, "destination": d, "departing_at": dep, "arriving_at": arr, "flights": list(fn)}
+                for o, d, dep, arr, fn in self.slices
+            ],
+        }
+
+
+class OfferSet:
+    """All offers for one offer request, with sorted and hashed indexes."""
+
+    def __init__(self):
+        self.records: List[OfferRecord] = []
+        self.by_id: Dict[str, int] = {}
+        self.by_price: List[Tuple[float, int]] = []
+        self.by_duration: List[Tuple[int, int]] = []
+        self.by_carrier: Dict[str, Set[int]] = {}
+        self.by_stops: Dict[int, Set[int]] = {}
+        # once every offer has expired the whole set can be dropped
+        self.latest_expiry: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, offers: Iterable[Dict[str, Any]]) -> int:
+        added = 0
+        for offer in offers:
+            if not offer.get("id") or offer["id"] in self.by_id:
+                continue
+            record = OfferRecord(offer)
+            idx = len(self.records)
+            self.records.append(record)
+            self.by_id[record.id] = idx
+            bisect.insort(self.by_price, (record.total_amount, idx))
+            bisect.insort(self.by_duration, (record.duration, idx))
+            for carrier in record.carriers:
+                self.by_carrier.setdefault(carrier, set()).add(idx)
+            self.by_stops.setdefault(record.stops, set()).add(idx)
+            if record.expires_at is not None and (self.latest_expiry is None or record.expires_at > self.latest_expiry):
+                self.latest_expiry = record.expires_at
+            added += 1
+        return added
+
+    def query(
+        self,
+        now: float,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        carriers: Optional[Iterable[str]] = None,
+        max_stops: Optional[int] = None,
+        max_duration: Optional[int] = None,
+        sort_by: str = "price",
+    ) -> List[OfferRecord]:
+        carrier_set = {c.upper() for c in carriers} if carriers else None
+
+        def matches(record: OfferRecord) -> bool:
+            if record.expires_at is not None and record.expires_at <= now:
+                return False
+            if min_price is not None and record.total_amount < min_price:
+                return False
+            if max_price is not None and record.total_amount > max_price:
+                return False
+            if max_duration is not None and record.duration > max_duration:
+                return False
+            if max_stops is not None and record.stops > max_stops:
+                return False
+            if carrier_set is not None and carrier_set.isdisjoint(record.carriers):
+                return False
+            return True
+
+        # Range of the sorted index that can match, narrowed by bisect.
+        if sort_by == "duration":
+            index = self.by_duration
+            lo = 0
+            hi = bisect.bisect_right(index, (max_duration, len(self.records))) if max_duration is not None else len(index)
+        else:
+            index = self.by_price
+            lo = bisect.bisect_left(index, (min_price, -1)) if min_price is not None else 0
+            hi = bisect.bisect_right(index, (max_price, len(self.records))) if max_price is not None else len(index)
+
+        # If a carrier/stops lookup is more selective than the index range,
+        # filter those candidates and sort them instead of walking the range.
+        candidates: Optional[List[int]] = None
+        if carrier_set is not None:
+            candidates = [i for c in carrier_set for i in self.by_carrier.get(c, ())]
+        if max_stops is not None:
+            by_stops = [i for stops, ids in self.by_stops.items() if stops <= max_stops for i in ids]
+            if candidates is None or len(by_stops) < len(candidates):
+                candidates = by_stops
+        if candidates is not None and len(candidates) < hi - lo:
+            key = (lambda r: (r.duration, r.total_amount)) if sort_by == "duration" else (lambda r: (r.total_amount, r.duration))
+            found = {i: self.records[i] for i in candidates}
+            return sorted((r for r in found.values() if matches(r)), key=key)
+
+        results = []
+        for _, idx in index[lo:hi]:
+            record = self.records[idx]
+            if matches(record):
+                results.append(record)
+        return results
+
+
+class OfferStore:
+    """
+    Offer sets keyed by offer_request_id, bounded by total offer count (LRU by
+    request). Sets whose offers have all expired are dropped on access.
+    """
+
+    def __init__(self, max_offers: int = 20000):
+        self.max_offers = max_offers
+        self._sets: "OrderedDict[str, OfferSet]" = OrderedDict()
+        self._count = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def add(self, offer_request_id: str, offers: Iterable[Dict[str, Any]]) -> int:
+        self.purge_expired()
+        offer_set = self._sets.get(offer_request_id)
+        if offer_set is None:
+            offer_set = self._sets[offer_request_id] = OfferSet()
+        self._sets.move_to_end(offer_request_id)
+        added = offer_set.add(offers)
+        self._count += added
+        while self._count > self.max_offers and len(self._sets) > 1:
+            _, old = self._sets.popitem(last=False)
+            self._count -= len(old)
+            self.evictions += 1
+        return added
+
+    def get(self, offer_request_id: str) -> Optional[OfferSet]:
+        self.purge_expired()
+        offer_set = self._sets.get(offer_request_id)
+        if offer_set is not None:
+            self._sets.move_to_end(offer_request_id)
+        return offer_set
+
+    def purge_expired(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        for request_id, offer_set in list(self._sets.items()):
+            if offer_set.latest_expiry is not None and offer_set.latest_expiry <= now:
+                del self._sets[request_id]
+                self._count -= len(offer_set)
+                self.expirations += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "offer_requests": len(self._sets),
+            "offers": self._count,
+            "max_offers": self.max_offers,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
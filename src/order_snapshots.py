@@ -0,0 +1,61 @@
+import json
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+# Order fields compared between polls. Slices are large, so schedule changes
+# are detected through a checksum instead of keeping them.
+TRACKED_FIELDS = (
+    "payment_status", "documents", "booking_reference", "cancelled_at",
+    "total_amount", "total_currency", "available_actions", "changes",
+    "airline_initiated_changes",
+)
+
+
+def summarize(order: Dict[str, Any]) -> Dict[str, Any]:
+    """The tracked fields of a Duffel order, plus a checksum of its slices."""
+    summary = {field: order.get(field) for field in TRACKED_FIELDS}
+    slices = json.dumps(order.get("slices") or [], sort_keys=True, separators=(",", ":"))
+    summary["slices_checksum"] = zlib.crc32(slices.encode())
+    return summary
+
+
+def is_settled(summary: Dict[str, Any]) -> bool:
+    """Cancelled, or paid and ticketed: nothing left to wait for."""
+    if summary.get("cancelled_at"):
+        return True
+    payment = summary.get("payment_status") or {}
+    return not payment.get("awaiting_payment") and bool(summary.get("documents"))
+
+
+class OrderSnapshots:
+    """
+    Last seen summary of each order, so a poll can report only what changed
+    since the previous one. LRU-bounded to max_orders.
+    """
+
+    def __init__(self, max_orders: int = 10000):
+        self.max_orders = max_orders
+        self._orders: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.updates = 0
+        self.changes = 0
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def update(self, order_id: str, summary: Dict[str, Any]) -> Tuple[bool, List[str]]:
+        """Store the latest summary; returns (first time seen, names of fields that changed)."""
+        previous = self._orders.pop(order_id, None)
+        self._orders[order_id] = summary
+        while len(self._orders) > self.max_orders:
+            self._orders.popitem(last=False)
+        self.updates += 1
+        if previous is None:
+            return True, [field for field, value in summary.items() if value not in (None, [], {})]
+        changed = [field for field, value in summary.items() if previous.get(field) != value]
+        if changed:
+            self.changes += 1
+        return False, changed
+
+    def stats(self) -> Dict[str, Any]:
+        return {"orders": len(self._orders), "max_orders": self.max_orders, "updates": self.updates, "changes": self.changes}
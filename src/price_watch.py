@@ -0,0 +1,397 @@
+import asyncio
+import contextvars
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    id TEXT PRIMARY KEY,
+    query_key TEXT NOT NULL,
+    query TEXT NOT NULL,
+    interval_s REAL NOT NULL,
+    target_price REAL,
+    created_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS watches_query ON watches (query_key);
+CREATE TABLE IF NOT EXISTS snapshots (
+    query_key TEXT NOT NULL,
+    polled_at REAL NOT NULL,
+    delta TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_query ON snapshots (query_key, polled_at);
+"""
+
+
+# Batches polled at once; when polls fall behind, later groups wait in the heap
+# (oldest due first) instead of piling up as tasks.
+_BATCHES_IN_FLIGHT = 2
+
+
+def snapshot(data: Dict[str, Any]) -> Dict[str, Any]:
+    """The few fields of a search_flights response a price watch keeps (~200 bytes of ~60 KB)."""
+    best = data.get("best_flights", [])
+    priced = [i for i in best + data.get("other_flights", []) if i.get("price") is not None]
+    cheapest = min(priced, key=lambda i: i["price"]) if priced else None
+    insights = data.get("price_insights") or {}
+    return {
+        "cheapest_price": cheapest["price"] if cheapest else None,
+        "cheapest_flights": [seg.get("flight_number") for seg in cheapest.get("flights", [])] if cheapest else [],
+        "best_price": best[0].get("price") if best else None,
+        "options": len(priced),
+        "lowest_price": insights.get("lowest_price"),
+        "price_level": insights.get("price_level"),
+        "typical_price_range": insights.get("typical_price_range"),
+    }
+
+
+def _delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in current.items() if previous.get(k) != v}
+
+
+class Watch:
+    __slots__ = ("id", "query_key", "query", "interval_s", "target_price", "created_at", "expires_at")
+
+    def __init__(
+        self,
+        id: str,
+        query_key: str,
+        query: Dict[str, Any],
+        interval_s: float,
+        target_price: Optional[float],
+        created_at: float,
+        expires_at: Optional[float],
+    ):
+        self.id = id
+        self.query_key = query_key
+        self.query = query
+        self.interval_s = interval_s
+        self.target_price = target_price
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+
+class _Group:
+    """Watches sharing one query; polled once for all of them."""
+
+    __slots__ = ("key", "query", "watches", "next_due", "last", "previous_price", "lowest_seen",
+                 "last_polled", "polls", "changes", "failures", "last_error")
+
+    def __init__(self, key: str, query: Dict[str, Any]):
+        self.key = key
+        self.query = query
+        self.watches: Dict[str, Watch] = {}
+        self.next_due: Optional[float] = None
+        self.last: Dict[str, Any] = {}
+        self.previous_price: Optional[float] = None
+        self.lowest_seen: Optional[float] = None
+        self.last_polled: Optional[float] = None
+        self.polls = 0
+        self.changes = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def interval_s(self) -> float:
+        return min(w.interval_s for w in self.watches.values())
+
+    def apply(self, state: Dict[str, Any]):
+        price = state.get("cheapest_price")
+        if price != self.last.get("cheapest_price"):
+            self.previous_price = self.last.get("cheapest_price")
+        if price is not None and (self.lowest_seen is None or price < self.lowest_seen):
+            self.lowest_seen = price
+        self.last = state
+
+
+class PriceWatcher:
+    """
+    Periodic fare polling for many watches in one asyncio task.
+
+    Watches on the same query (route, dates, class, passengers) form a group
+    that is polled once, at the shortest interval among them. Each group gets
+    a fixed phase within its interval derived from its query, so thousands
+    of watches (or a restart) don't poll in bursts; due groups are dispatched
+    in batches through `poll` with bounded concurrency, and a batch's
+    snapshots are written in one transaction.
+
+    Only a compact snapshot of each result is kept, stored as the fields that
+    changed since the group's previous snapshot (polls that change nothing
+    store nothing). Watches and history live in a SQLite file, so watches
+    survive restarts; SQLite calls run in a worker thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        poll: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        concurrency: int = 4,
+        batch_size: int = 32,
+        first_poll_within_s: float = 60.0,
+    ):
+        self.path = path
+        self._poll = poll
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.first_poll_within_s = first_poll_within_s
+        self._local = threading.local()
+        self._groups: Dict[str, _Group] = {}
+        self._watches: Dict[str, Watch] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._batches: set = set()
+        self._start_lock: Optional[asyncio.Lock] = None
+        self.batches = 0
+        self.snapshots_written = 0
+        self.write_errors = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- blocking helpers (run in a thread) ----------
+
+    def _load(self) -> Tuple[List[Watch], Dict[str, List[Tuple[float, Dict[str, Any]]]]]:
+        conn = self._conn()
+        watches = [
+            Watch(row[0], row[1], json.loads(row[2]), row[3], row[4], row[5], row[6])
+            for row in conn.execute(
+                "SELECT id, query_key, query, interval_s, target_price, created_at, expires_at FROM watches"
+            )
+        ]
+        history: Dict[str, List[Tuple[float, Dict[str, Any]]]] = {}
+        for key, polled_at, delta in conn.execute(
+            "SELECT query_key, polled_at, delta FROM snapshots ORDER BY query_key, polled_at"
+        ):
+            history.setdefault(key, []).append((polled_at, json.loads(delta)))
+        return watches, history
+
+    def _insert_watch(self, watch: Watch):
+        self._conn().execute(
+            "INSERT INTO watches (id, query_key, query, interval_s, target_price, created_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (watch.id, watch.query_key, json.dumps(watch.query, sort_keys=True), watch.interval_s,
+             watch.target_price, watch.created_at, watch.expires_at),
+        )
+
+    def _delete_watches(self, watch_ids: List[str], drop_history: List[str]):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM watches WHERE id = ?", [(w,) for w in watch_ids])
+            conn.executemany("DELETE FROM snapshots WHERE query_key = ?", [(k,) for k in drop_history])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _write_snapshots(self, rows: List[Tuple[str, float, str]]):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT INTO snapshots (query_key, polled_at, delta) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _read_history(self, key: str, since: float) -> List[Tuple[float, Dict[str, Any]]]:
+        rows = self._conn().execute(
+            "SELECT polled_at, delta FROM snapshots WHERE query_key = ? ORDER BY polled_at", (key,)
+        ).fetchall()
+        state: Dict[str, Any] = {}
+        history = []
+        for polled_at, delta in rows:
+            state = {**state, **json.loads(delta)}
+            if polled_at >= since:
+                history.append((polled_at, state))
+        return history
+
+    # ---------- scheduling ----------
+
+    def _phase(self, key: str, window: float) -> float:
+        """Fixed offset in [0, window) for a query, spreading groups evenly."""
+        return (zlib.crc32(key.encode()) % 10007) / 10007 * window
+
+    def _push(self, group: _Group, due: float):
+        group.next_due = due
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, group.key))
+        if self._wake is not None:
+            self._wake.set()
+
+    def _add(self, watch: Watch) -> _Group:
+        self._watches[watch.id] = watch
+        group = self._groups.get(watch.query_key)
+        if group is None:
+            group = self._groups[watch.query_key] = _Group(watch.query_key, watch.query)
+        group.watches[watch.id] = watch
+        return group
+
+    async def start(self):
+        """Load stored watches and start the polling loop (idempotent)."""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._task is not None:
+                return
+            watches, history = await asyncio.to_thread(self._load)
+            now = time.monotonic()
+            for watch in watches:
+                self._add(watch)
+            for key, group in self._groups.items():
+                for polled_at, delta in history.get(key, ()):
+                    group.apply({**group.last, **delta})
+                    group.last_polled = polled_at
+                # resume on the group's own phase rather than all at once
+                self._push(group, now + self._phase(key, group.interval_s))
+            self._wake = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            # the loop must not inherit the starting tool call's deadline or metrics
+            self._task = contextvars.Context().run(asyncio.ensure_future, self._run())
+
+    async def _run(self):
+        while True:
+            if len(self._batches) >= _BATCHES_IN_FLIGHT:
+                # polls are falling behind; dispatch more only as batches finish
+                await asyncio.wait(self._batches, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            now = time.monotonic()
+            batch: List[_Group] = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                due, _, key = heapq.heappop(self._heap)
+                group = self._groups.get(key)
+                if group is None or group.next_due != due:
+                    continue  # removed, or rescheduled since this entry was pushed
+                batch.append(group)
+                self._push(group, max(due + group.interval_s, now))
+            if batch:
+                task = asyncio.ensure_future(self._poll_batch(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+                continue
+            self._wake.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll_group(self, group: _Group) -> Optional[Tuple[str, float, str]]:
+        async with self._semaphore:
+            try:
+                state = snapshot(await self._poll(group.query))
+            except Exception as e:
+                group.failures += 1
+                group.last_error = str(e)[:200]
+                return None
+        polled_at = time.time()
+        group.polls += 1
+        group.last_polled = polled_at
+        group.last_error = None
+        delta = _delta(group.last, state) if group.last else state
+        if not delta:
+            return None
+        group.changes += 1
+        group.apply(state)
+        return group.key, polled_at, json.dumps(delta, separators=(",", ":"))
+
+    async def _poll_batch(self, batch: List[_Group]):
+        self.batches += 1
+        await self._expire()
+        batch = [g for g in batch if g.key in self._groups]
+        rows = [row for row in await asyncio.gather(*(self._poll_group(g) for g in batch)) if row]
+        if rows:
+            try:
+                await asyncio.to_thread(self._write_snapshots, rows)
+            except sqlite3.Error:
+                self.write_errors += 1
+                return
+            self.snapshots_written += len(rows)
+
+    async def _expire(self):
+        now = time.time()
+        expired = [w.id for w in self._watches.values() if w.expires_at is not None and w.expires_at <= now]
+        for watch_id in expired:
+            await self.remove(watch_id)
+
+    # ---------- API ----------
+
+    async def add(
+        self,
+        query_key: str,
+        query: Dict[str, Any],
+        interval_s: float,
+        target_price: Optional[float] = None,
+        expires_at: Optional[float] = None,
+    ) -> Tuple[Watch, _Group]:
+        await self.start()
+        watch = Watch(uuid.uuid4().hex[:12], query_key, query, interval_s, target_price, time.time(), expires_at)
+        await asyncio.to_thread(self._insert_watch, watch)
+        is_new = query_key not in self._groups
+        group = self._add(watch)
+        now = time.monotonic()
+        if is_new:
+            self._push(group, now + self._phase(query_key, min(interval_s, self.first_poll_within_s)))
+        elif group.next_due is not None and group.next_due > now + interval_s:
+            self._push(group, now + interval_s)  # the new watch wants a shorter interval
+        return watch, group
+
+    async def remove(self, watch_id: str) -> bool:
+        watch = self._watches.pop(watch_id, None)
+        if watch is None:
+            return False
+        group = self._groups[watch.query_key]
+        del group.watches[watch_id]
+        drop_history = []
+        if not group.watches:
+            del self._groups[group.key]
+            drop_history.append(group.key)
+        await asyncio.to_thread(self._delete_watches, [watch_id], drop_history)
+        return True
+
+    def get(self, watch_id: str) -> Optional[Watch]:
+        return self._watches.get(watch_id)
+
+    def group_of(self, watch: Watch) -> Optional[_Group]:
+        """The watch's poll group, or None once it was removed (unwatched or expired)."""
+        return self._groups.get(watch.query_key)
+
+    def watches(self) -> List[Watch]:
+        return sorted(self._watches.values(), key=lambda w: w.created_at)
+
+    async def history(self, watch: Watch, limit: int = 100) -> List[Tuple[float, Dict[str, Any]]]:
+        """Snapshots since the watch was created (newest last), rebuilt from the stored deltas."""
+        rows = await asyncio.to_thread(self._read_history, watch.query_key, watch.created_at)
+        return rows[-limit:] if limit else rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "watches": len(self._watches),
+            "groups": len(self._groups),
+            "running": self._task is not None and not self._task.done(),
+            "batches": self.batches,
+            "polls": sum(g.polls for g in self._groups.values()),
+            "failures": sum(g.failures for g in self._groups.values()),
+            "snapshots_written": self.snapshots_written,
+            "write_errors": self.write_errors,
+        }
@@ -0,0 +1,119 @@
+from typing import Any, Dict, Iterable, List, Optional, TypedDict
+
+VIEWS = ("full", "compact")
+# Extra fields a compact view can opt back into.
+INCLUDE_OPTIONS = ("departure_token", "booking_token", "logos", "extensions", "search_metadata", "price_history")
+
+
+class CompactSegment(TypedDict, total=False):
+    flight_number: str
+    airline: str
+    departure_id: str
+    arrival_id: str
+    departs: str
+    arrives: str
+    duration: int
+    airline_logo: str
+    extensions: List[str]
+
+
+class CompactItinerary(TypedDict, total=False):
+    price: Optional[int]
+    total_duration: Optional[int]
+    stops: int
+    carriers: List[str]
+    flight_numbers: List[str]
+    departs: Optional[str]
+    arrives: Optional[str]
+    layovers: List[Dict[str, Any]]
+    emissions_kg: Optional[float]
+    emissions_diff_percent: Optional[int]
+    segments: List[CompactSegment]
+    departure_token: str
+    booking_token: str
+    airline_logo: str
+    extensions: List[str]
+
+
+def check_view(view: str, include: Optional[Iterable[str]] = None):
+    if view not in VIEWS:
+        raise ValueError(f"view must be one of {VIEWS}, got {view!r}")
+    unknown = set(include or ()) - set(INCLUDE_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown include option(s) {sorted(unknown)}; choose from {INCLUDE_OPTIONS}")
+
+
+def compact_itinerary(itinerary: Dict[str, Any], include: Iterable[str] = ()) -> CompactItinerary:
+    """Slim, stable summary of one Google Flights itinerary."""
+    include = set(include)
+    flights = itinerary.get("flights", [])
+    segments: List[CompactSegment] = []
+    for seg in flights:
+        compact: CompactSegment = {
+            "flight_number": seg.get("flight_number"),
+            "airline": seg.get("airline"),
+            "departure_id": seg.get("departure_airport", {}).get("id"),
+            "arrival_id": seg.get("arrival_airport", {}).get("id"),
+            "departs": seg.get("departure_airport", {}).get("time"),
+            "arrives": seg.get("arrival_airport", {}).get("time"),
+            "duration": seg.get("duration"),
+        }
+        if "logos" in include and seg.get("airline_logo"):
+            compact["airline_logo"] = seg["airline_logo"]
+        if "extensions" in include and seg.get("extensions"):
+            compact["extensions"] = seg["extensions"]
+        segments.append(compact)
+
+    emissions = itinerary.get("carbon_emissions") or {}
+    result: CompactItinerary = {
+        "price": itinerary.get("price"),
+        "total_duration": itinerary.get("total_duration"),
+        "stops": max(len(flights) - 1, 0),
+        "carriers": sorted({s["airline"] for s in segments if s.get("airline")}),
+        "flight_numbers": [s["flight_number"] for s in segments],
+        "departs": segments[0]["departs"] if segments else None,
+        "arrives": segments[-1]["arrives"] if segments else None,
+        "layovers": [{"id": l.get("id"), "duration": l.get("duration")} for l in itinerary.get("layovers", [])],
+        "emissions_kg": round(emissions["this_flight"] / 1000, 1) if emissions.get("this_flight") else None,
+        "emissions_diff_percent": emissions.get("difference_percent"),
+        "segments": segments,
+    }
+    for token in ("departure_token", "booking_token"):
+        if token in include and itinerary.get(token):
+            result[token] = itinerary[token]
+    if "logos" in include and itinerary.get("airline_logo"):
+        result["airline_logo"] = itinerary["airline_logo"]
+    if "extensions" in include and itinerary.get("extensions"):
+        result["extensions"] = itinerary["extensions"]
+    return result
+
+
+def compact_price_insights(insights: Optional[Dict[str, Any]], include: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+    if not insights:
+        return None
+    slim = {k: insights.get(k) for k in ("lowest_price", "price_level", "typical_price_range")}
+    if "price_history" in include:
+        slim["price_history"] = insights.get("price_history")
+    return slim
+
+
+def compact_search(data: Dict[str, Any], include: Iterable[str] = ()) -> Dict[str, Any]:
+    """Compact view of a Google Flights search or flight-details response."""
+    include = set(include)
+    result: Dict[str, Any] = {
+        "best_flights": [compact_itinerary(f, include) for f in data.get("best_flights", [])],
+        "other_flights": [compact_itinerary(f, include) for f in data.get("other_flights", [])],
+        "price_insights": compact_price_insights(data.get("price_insights"), include),
+    }
+    if data.get("booking_options"):
+        result["booking_options"] = [
+            {
+                "book_with": (opt.get("together") or {}).get("book_with"),
+                "price": (opt.get("together") or {}).get("price"),
+                **({"booking_token": (opt.get("together") or {}).get("booking_token")} if "booking_token" in include else {}),
+            }
+            for opt in data["booking_options"]
+        ]
+    if "search_metadata" in include:
+        result["search_metadata"] = data.get("search_metadata")
+    return result
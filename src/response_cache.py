@@ -0,0 +1,161 @@
+import asyncio
+import contextvars
+import json
+
+import fastjson
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def make_key(tool: str, params: Dict[str, Any]) -> str:
+    """Build a stable cache key from request params, never including the api_key."""
+    cleaned = {k: v for k, v in params.items() if k != "api_key" and v is not None}
+    return f"{tool}:{json.dumps(cleaned, sort_keys=True, separators=(',', ':'), default=str)}"
+
+
+class _Entry:
+    __slots__ = ("value", "size", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, size: int, fresh_until: float, stale_until: float):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class TTLCache:
+    """
+    In-process LRU cache with per-entry TTL and stale-while-revalidate.
+
+    Entries are bounded both by count and by an approximate byte budget
+    (size of the JSON encoding). A fresh hit returns immediately; a stale hit
+    (past ttl but within ttl + stale) returns the old value and refreshes it in
+    the background; anything older is a miss.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.refresh_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _lookup(self, key: str, now: float) -> Tuple[Optional[_Entry], bool]:
+        """Return (entry, is_fresh); expired entries are dropped."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None, False
+        if now >= entry.stale_until:
+            self._remove(key)
+            self.expirations += 1
+            return None, False
+        self._data.move_to_end(key)
+        return entry, now < entry.fresh_until
+
+    def _remove(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def get(self, key: str, count: bool = False) -> Optional[Any]:
+        """Return a fresh or stale value without triggering a refresh; count=True counts it as a hit or miss."""
+        entry, fresh = self._lookup(key, time.monotonic())
+        if count:
+            if entry is None:
+                self.misses += 1
+            elif fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+        return entry.value if entry is not None else None
+
+    def set(self, key: str, value: Any, ttl: float, stale: float = 0.0, size: Optional[int] = None):
+        if size is None:
+            size = fastjson.size(value)
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        self._remove(key)
+        self._data[key] = _Entry(value, size, now + ttl, now + ttl + stale)
+        self._bytes += size
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            old_key, _ = next(iter(self._data.items()))
+            self._remove(old_key)
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale: float = 0.0,
+        allow_stale: bool = True,
+    ) -> Any:
+        """
+        Serve from cache when possible, otherwise await fetch() and store the result.
+        With allow_stale=False a stale entry counts as a miss and is fetched again.
+        """
+        entry, fresh = self._lookup(key, time.monotonic())
+        if entry is not None and (fresh or allow_stale):
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._schedule_refresh(key, fetch, ttl, stale)
+            return entry.value
+
+        self.misses += 1
+        value = await fetch()
+        self.set(key, value, ttl, stale)
+        return value
+
+    def _schedule_refresh(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float, stale: float):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                self.set(key, await fetch(), ttl, stale)
+            except Exception:
+                # Keep serving the stale copy until it ages out.
+                self.refresh_errors += 1
+            finally:
+                self._refreshing.pop(key, None)
+
+        # Run outside the caller's context: the refresh must not inherit the
+        # triggering call's deadline or be charged to its metrics.
+        self._refreshing[key] = contextvars.Context().run(asyncio.ensure_future, refresh())
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "backend": "memory",
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "refresh_errors": self.refresh_errors,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
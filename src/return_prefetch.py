@@ -0,0 +1,122 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from upstream_scheduler import TokenBucket
+
+
+class ReturnPrefetcher:
+    """
+    Background fetches of the return-leg results of round-trip searches.
+
+    search_flights registers the departure_token of every outbound option
+    (with the search it came from, which SerpAPI needs alongside the token)
+    and schedules the top few for prefetching. Prefetches run with bounded
+    concurrency and spend at most `budget` SerpAPI credits per `window_s`
+    seconds; tokens fetched within the last `ttl` seconds, or still in
+    flight, aren't fetched again. The fetch itself goes through the response
+    cache, so get_return_flights finds the result there, or joins the
+    prefetch if it is still running.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        budget: float = 100,
+        window_s: float = 3600.0,
+        ttl: float = 300.0,
+        max_tokens: int = 2048,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self._budget = TokenBucket(budget / window_s, budget)
+        self._searches: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # token -> when its prefetch finished, oldest first; bounded like _searches
+        self._fetched: "OrderedDict[str, float]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.skipped_budget = 0
+        self.skipped_duplicate = 0
+
+    def remember(self, token: str, search: Dict[str, Any]):
+        """Record the search a departure_token came from, for token-only lookups."""
+        self._searches.pop(token, None)
+        self._searches[token] = (search, time.monotonic() + self.ttl)
+        while len(self._searches) > self.max_tokens:
+            self._searches.popitem(last=False)
+
+    def search_for(self, token: str) -> Optional[Dict[str, Any]]:
+        """The search params a live token came from, or None if unknown or expired."""
+        found = self._searches.get(token)
+        if found is None:
+            return None
+        search, expires = found
+        if time.monotonic() >= expires:
+            del self._searches[token]
+            return None
+        return search
+
+    def _prune_fetched(self, now: float):
+        """Forget prefetches older than ttl (tokens are rarely looked up twice)."""
+        while self._fetched:
+            token, fetched_at = next(iter(self._fetched.items()))
+            if now - fetched_at < self.ttl:
+                break
+            del self._fetched[token]
+
+    def schedule(self, tokens: Iterable[str], fetch: Callable[[str], Awaitable[Any]]) -> int:
+        """Start background fetches for tokens; returns how many were started."""
+        now = time.monotonic()
+        self._prune_fetched(now)
+        started = 0
+        for token in tokens:
+            if token in self._tasks or token in self._fetched:
+                self.skipped_duplicate += 1
+                continue
+            if self._budget.wait_time() > 0:
+                self.skipped_budget += 1
+                continue
+            self._budget.take()
+            # Run outside the caller's context: a prefetch must not inherit the
+            # search's deadline or be charged to its metrics.
+            task = contextvars.Context().run(asyncio.ensure_future, self._run(token, fetch))
+            self._tasks[token] = task
+            task.add_done_callback(lambda _t, k=token: self._tasks.pop(k, None))
+            self.scheduled += 1
+            started += 1
+        return started
+
+    async def _run(self, token: str, fetch: Callable[[str], Awaitable[Any]]):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            try:
+                await fetch(token)
+            except Exception:
+                self.failed += 1  # get_return_flights will fetch it again and report the error
+                return
+        self._fetched.pop(token, None)
+        self._fetched[token] = time.monotonic()
+        while len(self._fetched) > self.max_tokens:
+            self._fetched.popitem(last=False)
+        self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        self._budget.wait_time()  # refill before reporting
+        return {
+            "in_flight": len(self._tasks),
+            "known_tokens": len(self._searches),
+            "recently_fetched": len(self._fetched),
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped_budget": self.skipped_budget,
+            "skipped_duplicate": self.skipped_duplicate,
+            "budget_available": int(self._budget.tokens),
+        }
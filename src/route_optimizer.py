@@ -0,0 +1,171 @@
+import asyncio
+import heapq
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# (from, to, YYYY-MM-DD)
+Leg = Tuple[str, str, str]
+# (city, bitmask of visited cities, day as date.toordinal()); city None = trip finished
+State = Tuple[Optional[str], int, int]
+# leg -> (price, details) or None when the leg can't be flown
+LegPricer = Callable[[Leg], Awaitable[Optional[Tuple[float, Any]]]]
+
+
+class RouteOptimizer:
+    """
+    Cheapest order and dates for visiting a set of cities from a home airport.
+
+    The trip is a path through states (current city, cities visited so far,
+    day), which is what a Held-Karp style DP tabulates. Instead of pricing
+    every leg of that table up front, the states are expanded cheapest-first
+    (uniform-cost search, i.e. Dijkstra with DP dominance on the state): a
+    state's outgoing legs are priced only when it is expanded, and the search
+    stops at the first finished trip, which is optimal because prices are
+    non-negative. States whose partial cost already exceeds the answer are
+    never expanded, so their legs are never requested. Leg prices are
+    memoized across states, and each expansion prices its missing legs
+    concurrently.
+    """
+
+    def __init__(
+        self,
+        origin: str,
+        cities: List[str],
+        departure_dates: List[str],
+        stays: Dict[str, Tuple[int, int]],
+        return_to_origin: bool = True,
+        latest_return: Optional[str] = None,
+    ):
+        self.origin = origin
+        self.cities = cities
+        self.full = (1 << len(cities)) - 1
+        self.departure_days = [date.fromisoformat(d).toordinal() for d in departure_dates]
+        self.stays = stays
+        self.return_to_origin = return_to_origin
+        self.latest = date.fromisoformat(latest_return).toordinal() if latest_return else None
+        self.prices: Dict[Leg, Optional[Tuple[float, Any]]] = {}
+        self.expanded = 0
+
+    @staticmethod
+    def _leg(a: str, b: str, day: int) -> Leg:
+        return a, b, date.fromordinal(day).isoformat()
+
+    def successors(self, state: State) -> List[Tuple[Optional[Leg], State]]:
+        """(leg, next state) pairs; leg is None for the free step that ends a one-way trip."""
+        city, mask, day = state
+        if city is None:
+            return []
+        if mask == 0:
+            days = self.departure_days
+        else:
+            low, high = self.stays[city]
+            days = [day + nights for nights in range(low, high + 1)]
+        if self.latest is not None:
+            days = [d for d in days if d <= self.latest]
+
+        if mask == self.full:
+            if not self.return_to_origin:
+                return [(None, (None, mask, day))]
+            return [(self._leg(city, self.origin, d), (None, mask, d)) for d in days]
+        return [
+            (self._leg(city, target, d), (target, mask | (1 << i), d))
+            for i, target in enumerate(self.cities)
+            if not mask & (1 << i)
+            for d in days
+        ]
+
+    def start(self) -> State:
+        return self.origin, 0, 0
+
+    def brute_force(self) -> Tuple[int, int]:
+        """(distinct legs, complete itineraries) an exhaustive search would have to price."""
+        legs = set()
+        paths: Dict[State, int] = {}
+
+        def count(state: State) -> int:
+            if state[0] is None:
+                return 1
+            if state not in paths:
+                total = 0
+                for leg, nxt in self.successors(state):
+                    if leg is not None:
+                        legs.add(leg)
+                    total += count(nxt)
+                paths[state] = total
+            return paths[state]
+
+        itineraries = count(self.start())
+        return len(legs), itineraries
+
+    async def solve(self, price: LegPricer, max_legs: int, concurrency: int = 6, wave: int = 4) -> Dict[str, Any]:
+        """
+        Run the search, pricing at most max_legs legs. Each round expands the
+        `wave` cheapest frontier states together so their legs are fetched
+        concurrently (wave=1 is plain uniform-cost search, the fewest calls;
+        larger waves trade a few speculative legs for fewer round trips).
+        Returns the cheapest itinerary (None if there is none) and whether
+        the search completed within the budget.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def fetch(leg: Leg):
+            async with semaphore:
+                self.prices[leg] = await price(leg)
+
+        start = self.start()
+        best: Dict[State, float] = {start: 0.0}
+        parent: Dict[State, Tuple[State, Optional[Leg]]] = {}
+        heap: List[Tuple[float, int, State]] = [(0.0, 0, start)]
+        seq = 0
+        while heap:
+            batch: List[Tuple[float, State]] = []
+            while heap and len(batch) < max(1, wave):
+                cost, n, state = heapq.heappop(heap)
+                if cost > best.get(state, float("inf")):
+                    continue  # a cheaper way to this state was already found
+                if state[0] is None:
+                    if not batch:
+                        return {"complete": True, "cost": cost, "legs": self._path(parent, state)}
+                    heapq.heappush(heap, (cost, n, state))  # cheaper states in this wave go first
+                    break
+                batch.append((cost, state))
+
+            expansions = [(cost, state, self.successors(state)) for cost, state in batch]
+            missing = list(dict.fromkeys(
+                leg for _, _, steps in expansions for leg, _ in steps if leg is not None and leg not in self.prices
+            ))
+            if len(self.prices) + len(missing) > max_legs and len(expansions) > 1:
+                # over budget: keep only the cheapest state, the others go back
+                for cost, state, _ in expansions[1:]:
+                    seq += 1
+                    heapq.heappush(heap, (cost, seq, state))
+                expansions = expansions[:1]
+                missing = list(dict.fromkeys(
+                    leg for leg, _ in expansions[0][2] if leg is not None and leg not in self.prices
+                ))
+            if len(self.prices) + len(missing) > max_legs:
+                return {"complete": False, "cost": None, "legs": None}
+            if missing:
+                await asyncio.gather(*(fetch(leg) for leg in missing))
+
+            for cost, state, steps in expansions:
+                self.expanded += 1
+                for leg, nxt in steps:
+                    priced = self.prices[leg] if leg is not None else (0.0, None)
+                    if priced is None:
+                        continue
+                    new_cost = cost + priced[0]
+                    if new_cost < best.get(nxt, float("inf")):
+                        best[nxt] = new_cost
+                        parent[nxt] = (state, leg)
+                        seq += 1
+                        heapq.heappush(heap, (new_cost, seq, nxt))
+        return {"complete": True, "cost": None, "legs": None}
+
+    def _path(self, parent: Dict[State, Tuple[State, Optional[Leg]]], state: State) -> List[Leg]:
+        legs: List[Leg] = []
+        while state in parent:
+            state, leg = parent[state]
+            if leg is not None:
+                legs.append(leg)
+        return legs[::-1]
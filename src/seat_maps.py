@@ -0,0 +1,301 @@
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+VIEWS = ("full", "compact")
+POSITIONS = ("window", "aisle", "middle")
+
+# Compact grid characters. An available seat is the index of its price tier
+# in the seat map's "prices" table (TIER_CHARS[i]); seats in tiers past the
+# alphabet are EXTRA_TIER, with their tier listed under the cabin's "extra".
+TIER_CHARS = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+EXTRA_TIER = "+"
+TAKEN = "x"     # seat exists but has no service for any passenger
+NO_SEAT = "."   # no seat at this row/column (galley, missing seat, ...)
+AISLE = " "
+
+_DESIGNATOR = re.compile(r"^(\d+)([A-Z]+)$")
+
+
+class Seat(NamedTuple):
+    designator: str
+    row: int
+    column: str
+    # (passenger_id, service_id, total_amount, total_currency) per passenger it can be booked for
+    services: Tuple[Tuple[str, str, str, str], ...]
+
+    @property
+    def available(self) -> bool:
+        return bool(self.services)
+
+    @property
+    def price(self) -> float:
+        """Highest price over the passengers it is offered to."""
+        return max(float(amount) for _, _, amount, _ in self.services)
+
+    @property
+    def currency(self) -> Optional[str]:
+        return self.services[0][3] if self.services else None
+
+
+class Cabin:
+    """One cabin of a seat map, laid out as rows x columns with aisles between column blocks."""
+
+    def __init__(self, cabin: Dict[str, Any]):
+        self.cabin_class = cabin.get("cabin_class")
+        self.deck = cabin.get("deck")
+        self.rows: Dict[int, Dict[str, Seat]] = {}
+        self.exit_rows: List[int] = []
+        aisle_after = set()
+        for row in cabin.get("rows") or []:
+            number = None
+            exit_row = False
+            blocks = []
+            for section in row.get("sections") or []:
+                block = []
+                for element in section.get("elements") or []:
+                    exit_row = exit_row or element.get("type") == "exit_row"
+                    if element.get("type") != "seat":
+                        continue
+                    match = _DESIGNATOR.match(element.get("designator") or "")
+                    if not match:
+                        continue
+                    number, column = int(match.group(1)), match.group(2)
+                    services = tuple(
+                        (s.get("passenger_id"), s.get("id"), s.get("total_amount"), s.get("total_currency"))
+                        for s in element.get("available_services") or []
+                    )
+                    self.rows.setdefault(number, {})[column] = Seat(element["designator"], number, column, services)
+                    block.append(column)
+                if block:
+                    blocks.append(block)
+            if exit_row and number is not None:
+                self.exit_rows.append(number)
+            for block in blocks[:-1]:
+                aisle_after.add(max(block, key=_column_order))
+        self.exit_rows = sorted(set(self.exit_rows))
+        self.columns = sorted({c for seats in self.rows.values() for c in seats}, key=_column_order)
+        # column -> aisle block index, counted left to right
+        self.block: Dict[str, int] = {}
+        n = 0
+        for column in self.columns:
+            self.block[column] = n
+            if column in aisle_after:
+                n += 1
+        self.aisle_after = aisle_after
+
+    def position(self, column: str) -> str:
+        i = self.columns.index(column)
+        if i in (0, len(self.columns) - 1):
+            return "window"
+        if column in self.aisle_after or self.columns[i - 1] in self.aisle_after:
+            return "aisle"
+        return "middle"
+
+    def layout(self) -> str:
+        """Column letters with a space for each aisle, e.g. "ABC DEFG HJK"."""
+        return "".join(c + (AISLE if c in self.aisle_after else "") for c in self.columns)
+
+    def seats(self) -> Iterable[Seat]:
+        for number in sorted(self.rows):
+            yield from self.rows[number].values()
+
+
+class SeatMap:
+    """A Duffel seat map (one segment), parsed once for compacting, filtering and indexing."""
+
+    def __init__(self, seat_map: Dict[str, Any]):
+        self.raw = seat_map
+        self.id = seat_map.get("id")
+        self.segment_id = seat_map.get("segment_id")
+        self.slice_id = seat_map.get("slice_id")
+        self.cabins = [Cabin(cabin) for cabin in seat_map.get("cabins") or []]
+
+
+def _column_order(column: str) -> Tuple[int, str]:
+    return len(column), column
+
+
+def _tier_key(seat: Seat) -> Tuple[Tuple[str, str, str], ...]:
+    return tuple(sorted((passenger, amount, currency) for passenger, _, amount, currency in seat.services))
+
+
+def _tier(key: Tuple[Tuple[str, str, str], ...]) -> Dict[str, Any]:
+    amounts = {amount for _, amount, _ in key}
+    tier = {"amount": max(amounts, key=float), "currency": key[0][2], "passengers": len(key)}
+    if len(amounts) > 1:
+        tier["per_passenger"] = {passenger: amount for passenger, amount, _ in key}
+    return tier
+
+
+def compact(seat_map: SeatMap) -> Dict[str, Any]:
+    """
+    Compact form of one Duffel seat map. Each cabin becomes a grid with one
+    string per row and one character per column of `columns`: a price tier
+    index for an available seat, TAKEN, NO_SEAT, or a space at an aisle.
+    Prices are deduplicated into the map's "prices" table (a tier is the set
+    of passengers the seat is offered to and what each pays); service IDs are
+    left out and resolved by SeatServiceIndex when the order is created.
+    """
+    tiers: Dict[Tuple[Tuple[str, str, str], ...], int] = {}
+    cabins = []
+    available = 0
+    for cabin in seat_map.cabins:
+        grid = []
+        extra: Dict[str, int] = {}
+        for number in sorted(cabin.rows):
+            seats = cabin.rows[number]
+            cells = []
+            for column in cabin.columns:
+                seat = seats.get(column)
+                if seat is None:
+                    cells.append(NO_SEAT)
+                elif not seat.available:
+                    cells.append(TAKEN)
+                else:
+                    available += 1
+                    tier = tiers.setdefault(_tier_key(seat), len(tiers))
+                    if tier < len(TIER_CHARS):
+                        cells.append(TIER_CHARS[tier])
+                    else:
+                        cells.append(EXTRA_TIER)
+                        extra[seat.designator] = tier
+                if column in cabin.aisle_after:
+                    cells.append(AISLE)
+            grid.append("".join(cells))
+        compacted = {
+            "cabin_class": cabin.cabin_class,
+            "deck": cabin.deck,
+            "columns": cabin.layout(),
+            "rows": sorted(cabin.rows),
+            "grid": grid,
+        }
+        if cabin.exit_rows:
+            compacted["exit_rows"] = cabin.exit_rows
+        if extra:
+            compacted["extra"] = extra
+        cabins.append(compacted)
+    return {
+        "id": seat_map.id,
+        "segment_id": seat_map.segment_id,
+        "slice_id": seat_map.slice_id,
+        "available": available,
+        "prices": [_tier(key) for key in tiers],
+        "cabins": cabins,
+    }
+
+
+def find_seats(
+    seat_map: SeatMap,
+    together: int = 1,
+    position: Optional[str] = None,
+    max_price: Optional[float] = None,
+    limit: int = 10,
+) -> List[Dict[str, Any]]:
+    """
+    Cheapest runs of `together` available seats side by side in one row
+    (no aisle between them), each costing at most max_price, including a
+    seat at `position` ("window", "aisle" or "middle") when given.
+    """
+    options = []
+    for cabin in seat_map.cabins:
+        for number in sorted(cabin.rows):
+            seats = cabin.rows[number]
+            for start in range(len(cabin.columns) - together + 1):
+                columns = cabin.columns[start:start + together]
+                if cabin.block[columns[0]] != cabin.block[columns[-1]]:
+                    continue
+                run = [seats.get(c) for c in columns]
+                if any(s is None or not s.available for s in run):
+                    continue
+                if max_price is not None and any(s.price > max_price for s in run):
+                    continue
+                if position is not None and all(cabin.position(c) != position for c in columns):
+                    continue
+                total = sum(s.price for s in run)
+                options.append(((total, number, start), {
+                    "segment_id": seat_map.segment_id,
+                    "cabin_class": cabin.cabin_class,
+                    "seats": [s.designator for s in run],
+                    "total_amount": f"{total:.2f}",
+                    "currency": run[0].currency,
+                    "exit_row": number in cabin.exit_rows,
+                }))
+    options.sort(key=lambda o: o[0])
+    return [option for _, option in options[:limit]]
+
+
+class SeatServiceIndex:
+    """
+    Seat designator -> Duffel seat service ID per passenger, from the seat maps
+    last fetched for each offer, so an order can be created from the seats
+    chosen in a compact seat map. LRU-bounded to max_offers.
+    """
+
+    def __init__(self, max_offers: int = 1000):
+        self.max_offers = max_offers
+        # offer_id -> segment_id -> designator -> passenger_id -> (service_id, amount, currency)
+        self._offers: "OrderedDict[str, Dict[str, Dict[str, Dict[str, Tuple[str, str, str]]]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._offers)
+
+    def __contains__(self, offer_id: str) -> bool:
+        return offer_id in self._offers
+
+    def remember(self, offer_id: str, seat_maps: List[SeatMap]):
+        segments: Dict[str, Dict[str, Dict[str, Tuple[str, str, str]]]] = {}
+        for seat_map in seat_maps:
+            seats = segments.setdefault(seat_map.segment_id, {})
+            for cabin in seat_map.cabins:
+                for seat in cabin.seats():
+                    seats[seat.designator] = {
+                        passenger: (service, amount, currency) for passenger, service, amount, currency in seat.services
+                    }
+        self._offers.pop(offer_id, None)
+        self._offers[offer_id] = segments
+        while len(self._offers) > self.max_offers:
+            self._offers.popitem(last=False)
+
+    def resolve(self, offer_id: str, seats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Service IDs for seats given as {"passenger_id", "designator", "segment_id"};
+        segment_id may be left out when the designator is on one segment only.
+        Raises ValueError for unknown, unavailable or doubly chosen seats.
+        """
+        segments = self._offers.get(offer_id)
+        if segments is None:
+            raise ValueError(f"No seat maps known for offer {offer_id}")
+        self._offers.move_to_end(offer_id)
+        resolved = []
+        taken = set()
+        for choice in seats:
+            designator = (choice.get("designator") or "").upper()
+            passenger = choice.get("passenger_id")
+            segment = choice.get("segment_id")
+            if segment is None:
+                candidates = [s for s, designators in segments.items() if designator in designators]
+                if len(candidates) > 1:
+                    raise ValueError(f"Seat {designator} exists on several segments; give its segment_id")
+                segment = candidates[0] if candidates else None
+            offered = segments.get(segment, {}).get(designator)
+            if offered is None:
+                raise ValueError(f"Seat {designator} is not on the seat map of segment {segment}")
+            if passenger not in offered:
+                raise ValueError(f"Seat {designator} on segment {segment} is not available for passenger {passenger}")
+            if (segment, designator) in taken:
+                raise ValueError(f"Seat {designator} on segment {segment} is chosen twice")
+            taken.add((segment, designator))
+            service, amount, currency = offered[passenger]
+            resolved.append({
+                "segment_id": segment,
+                "designator": designator,
+                "passenger_id": passenger,
+                "service_id": service,
+                "total_amount": amount,
+                "total_currency": currency,
+            })
+        return resolved
+
+    def stats(self) -> Dict[str, Any]:
+        return {"offers": len(self._offers), "max_offers": self.max_offers}
@@ -0,0 +1,201 @@
+import asyncio
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import fastjson
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fresh_until REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at);
+CREATE INDEX IF NOT EXISTS cache_stale ON cache (stale_until);
+"""
+
+
+class SQLiteCache:
+    """
+    On-disk response cache shared by every server process on a host.
+
+    Values are stored as zlib-compressed JSON in a WAL-mode SQLite database,
+    so readers in other processes never block on a writer. Entries carry
+    wall-clock fresh/stale deadlines (same semantics as TTLCache), and the
+    least recently used rows are evicted once the stored bytes exceed
+    max_bytes. SQLite calls run in a worker thread to keep the event loop free;
+    the entry and byte totals reported by stats() are refreshed by those calls
+    rather than read from the database on the loop.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, compress_level: int = 6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self._local = threading.local()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refresh_errors = 0
+        # totals across all processes, as of this process's last write
+        self._entries = 0
+        self._bytes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+        self._entries, self._bytes = self._summary()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    # ---------- blocking helpers (run in a thread) ----------
+
+    def _read(self, key: str) -> Optional[Tuple[Any, bool]]:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, fresh_until, stale_until FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        blob, fresh_until, stale_until = row
+        if now >= stale_until:
+            conn.execute("DELETE FROM cache WHERE key = ? AND stale_until <= ?", (key, now))
+            return None
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return fastjson.Document(zlib.decompress(blob)), now < fresh_until
+
+    def _write(self, key: str, value: Any, ttl: float, stale: float):
+        blob = zlib.compress(fastjson.encode(value), self.compress_level)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, fresh_until, stale_until, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl, now + ttl + stale, now),
+            )
+            conn.execute("DELETE FROM cache WHERE stale_until <= ?", (now,))
+            entries, total = self._summary()
+            while total > self.max_bytes:
+                oldest = conn.execute(
+                    "SELECT key, size FROM cache WHERE key != ? ORDER BY accessed_at LIMIT 64", (key,)
+                ).fetchall()
+                if not oldest:
+                    break
+                for old_key, size in oldest:
+                    conn.execute("DELETE FROM cache WHERE key = ?", (old_key,))
+                    entries -= 1
+                    total -= size
+                    self.evictions += 1
+                    if total <= self.max_bytes:
+                        break
+            conn.execute("COMMIT")
+            self._entries, self._bytes = entries, total
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _summary(self) -> Tuple[int, int]:
+        return self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+
+    def _delete(self, key: Optional[str] = None):
+        conn = self._conn()
+        if key is None:
+            conn.execute("DELETE FROM cache")
+        else:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        self._entries, self._bytes = self._summary()
+
+    # ---------- async API ----------
+    # get_or_fetch() and stats() match TTLCache, which is all the server uses
+    # through search_cache; get/set/invalidate/clear are coroutines here.
+
+    async def get(self, key: str) -> Optional[Any]:
+        found = await asyncio.to_thread(self._read, key)
+        return found[0] if found else None
+
+    async def set(self, key: str, value: Any, ttl: float, stale: float = 0.0):
+        await asyncio.to_thread(self._write, key, value, ttl, stale)
+
+    async def invalidate(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    async def clear(self):
+        await asyncio.to_thread(self._delete)
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale: float = 0.0,
+        allow_stale: bool = True,
+    ) -> Any:
+        found = await asyncio.to_thread(self._read, key)
+        if found is not None and (found[1] or allow_stale):
+            value, fresh = found
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._schedule_refresh(key, fetch, ttl, stale)
+            return value
+
+        self.misses += 1
+        value = await fetch()
+        await self.set(key, value, ttl, stale)
+        return value
+
+    def _schedule_refresh(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float, stale: float):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self.set(key, await fetch(), ttl, stale)
+            except Exception:
+                self.refresh_errors += 1
+            finally:
+                self._refreshing.pop(key, None)
+
+        # Run outside the caller's context: the refresh must not inherit the
+        # triggering call's deadline or be charged to its metrics.
+        self._refreshing[key] = contextvars.Context().run(asyncio.ensure_future, refresh())
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "refresh_errors": self.refresh_errors,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,213 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+# Lower runs first. Booking and payment calls jump ahead of exploratory searches.
+PRIORITY_PAYMENT = 0
+PRIORITY_BOOKING = 1
+PRIORITY_SEARCH = 5
+PRIORITY_BACKGROUND = 9
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class QuotaExceeded(Exception):
+    """The configured request budget for a provider is used up."""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available (0 if one is available now)."""
+        self._refill(time.monotonic())
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0 if self.tokens >= 1 else float("inf")
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse Retry-After as seconds or an HTTP date."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime  # rarely needed; keep it off the import path
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderQueue:
+    """Priority queue of callers waiting for a provider's rate-limit tokens."""
+
+    def __init__(self, name: str, rate: float, burst: float, credit_limit: Optional[int] = None):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.credit_limit = credit_limit
+        self.credits_used = 0
+        self.paused_until = 0.0
+        self.dispatched = 0
+        self.retries = 0
+        self.throttled = 0
+        self._heap: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def depth(self) -> int:
+        return sum(1 for _, _, fut in self._heap if not fut.done())
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # new event loop (e.g. a fresh asyncio.run()); old waiters are gone with it
+            self._loop = loop
+            self._heap = []
+            self._dispatcher = None
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def acquire(self, priority: int):
+        if self.credit_limit is not None and self.credits_used >= self.credit_limit:
+            raise QuotaExceeded(f"{self.name} request budget of {self.credit_limit} is used up")
+        self._ensure_dispatcher()
+        fut = self._loop.create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), fut))
+        self._wakeup.set()
+        await fut
+        self.credits_used += 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.throttled += 1
+
+    async def _dispatch(self):
+        while True:
+            while self._heap and self._heap[0][2].done():
+                heapq.heappop(self._heap)  # cancelled waiter
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            wait = max(self.paused_until - time.monotonic(), self.bucket.wait_time())
+            if wait > 0:
+                # sleep, but wake early if a higher-priority caller arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, fut = heapq.heappop(self._heap)
+            if fut.done():
+                continue
+            self.bucket.take()
+            self.dispatched += 1
+            fut.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        self.bucket._refill(time.monotonic())
+        return {
+            "queue_depth": self.depth(),
+            "tokens_available": round(self.bucket.tokens, 2),
+            "rate_per_s": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "paused_for_s": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            "requests_sent": self.dispatched,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "budget_limit": self.credit_limit,
+            "budget_remaining": None if self.credit_limit is None else max(0, self.credit_limit - self.credits_used),
+        }
+
+
+class UpstreamScheduler:
+    """
+    Shared gate in front of every upstream request: rate limiting per
+    provider, priority ordering, and retry with jittered backoff that honors
+    Retry-After on 429/503.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.providers: Dict[str, ProviderQueue] = {}
+
+    def add_provider(self, name: str, rate: float, burst: float, credit_limit: Optional[int] = None):
+        self.providers[name] = ProviderQueue(name, rate, burst, credit_limit)
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def request(
+        self,
+        provider: str,
+        priority: int,
+        send: Callable[[], Awaitable[httpx.Response]],
+        retry_errors: bool = True,
+    ) -> httpx.Response:
+        """
+        Run send() once a rate-limit slot is granted, retrying throttled or
+        unavailable responses. 429s are always retried (the upstream did not
+        process the request); 5xx and transport errors only when retry_errors
+        is set, which callers turn off for non-idempotent requests.
+        """
+        queue = self.providers[provider]
+        attempt = 0
+        while True:
+            await queue.acquire(priority)
+            try:
+                response = await send()
+            except httpx.TransportError:
+                if not retry_errors or attempt >= self.max_retries:
+                    raise
+                queue.retries += 1
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            retryable = response.status_code == 429 or (retry_errors and response.status_code in RETRY_STATUSES)
+            if not retryable or attempt >= self.max_retries:
+                return response
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = self._backoff(attempt)
+            else:
+                delay = min(delay, self.max_delay) + random.uniform(0, self.base_delay)
+            if response.status_code in (429, 503):
+                queue.pause(delay)
+            queue.retries += 1
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: queue.stats() for name, queue in self.providers.items()}